@@ -0,0 +1,9 @@
+
+ALTER TABLE ELN_WRITEUP_SCRAPPED 
+ADD COLUMN IF NOT EXISTS reactants JSONB,
+ADD COLUMN IF NOT EXISTS solvents JSONB,
+ADD COLUMN IF NOT EXISTS products JSONB;
+
+CREATE INDEX IF NOT EXISTS eln_writeup_scrapped_reactants_gin ON ELN_WRITEUP_SCRAPPED USING GIN (reactants jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS eln_writeup_scrapped_solvents_gin ON ELN_WRITEUP_SCRAPPED USING GIN (solvents jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS eln_writeup_scrapped_products_gin ON ELN_WRITEUP_SCRAPPED USING GIN (products jsonb_path_ops);
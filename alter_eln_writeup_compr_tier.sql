@@ -0,0 +1,3 @@
+
+ALTER TABLE ELN_WRITEUP_COMPARISON 
+ADD COLUMN IF NOT EXISTS compare_tier VARCHAR(20);
@@ -0,0 +1,3 @@
+
+ALTER TABLE ELN_WRITEUP_API_EXTRACT 
+ADD COLUMN IF NOT EXISTS minhash BYTEA;
@@ -0,0 +1,6 @@
+
+ALTER TABLE ELN_WRITEUP_API_EXTRACT 
+ADD COLUMN IF NOT EXISTS normalized_text TEXT;
+
+ALTER TABLE ELN_WRITEUP_SCRAPPED 
+ADD COLUMN IF NOT EXISTS normalized_text TEXT;
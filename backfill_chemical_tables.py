@@ -0,0 +1,88 @@
+"""
+Backfill the reactants/solvents/products JSONB columns of ELN_WRITEUP_SCRAPPED
+for rows scraped before the chemical tables were parsed at ingestion.
+
+Rows are streamed through a server-side cursor and updated and committed in
+batches, so the run can be stopped and restarted; only rows with none of the
+JSONB columns set are read. A missing or unparseable table is stored as JSON
+null, so rows that were parsed once are not read again.
+
+Usage:
+    python backfill_chemical_tables.py -b 500
+"""
+
+import argparse
+import psycopg2
+import psycopg2.extras
+from os import getenv
+from dotenv import load_dotenv
+from writeup_parser import parse_table
+
+
+load_dotenv(override=True)
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+
+
+def as_json(table_html):
+    # JSON null, not SQL NULL, marks a table without content as parsed
+    return psycopg2.extras.Json(parse_table(table_html) if table_html else None)
+
+
+def backfill(batch_size=500):
+    """
+    Parse and store the chemical tables of the rows that have no JSONB tables.
+
+    Args:
+        batch_size (int): Rows fetched and updated per round trip.
+    """
+    connection = psycopg2.connect(**DB_CONFIG)
+    read_cursor = connection.cursor(name="backfill_chemical_tables", withhold=True)
+    read_cursor.itersize = batch_size
+    read_cursor.execute(
+        """
+        SELECT exp_id, system_name, reactants_table, solvents_table, products_table
+        FROM ELN_WRITEUP_SCRAPPED
+        WHERE reactants IS NULL AND solvents IS NULL AND products IS NULL
+        """
+    )
+    cursor = connection.cursor()
+    total = 0
+    while True:
+        batch = read_cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        psycopg2.extras.execute_batch(
+            cursor,
+            """
+            UPDATE ELN_WRITEUP_SCRAPPED SET reactants = %s, solvents = %s, products = %s
+            WHERE exp_id = %s AND system_name = %s
+            """,
+            [
+                (as_json(reactants), as_json(solvents), as_json(products), exp_id, system_name)
+                for exp_id, system_name, reactants, solvents, products in batch
+            ],
+        )
+        connection.commit()
+        total += len(batch)
+        print(f"{total} rows parsed...")
+    read_cursor.close()
+    cursor.close()
+    connection.close()
+    print(f"{total} rows backfilled")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfill the JSONB chemical tables of scraped ELN writeups"
+    )
+    parser.add_argument(
+        "-b", "--batch_size", type=int, default=500, help="Rows per batch"
+    )
+    args = parser.parse_args()
+    backfill(args.batch_size)
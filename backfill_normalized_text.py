@@ -0,0 +1,103 @@
+"""
+Backfill the normalized_text column for writeups stored before normalization
+ran at ingestion.
+
+Rows are streamed through a server-side cursor and updated and committed in
+batches, so the run can be stopped and restarted; only rows with a NULL
+normalized_text are read. The minhash signatures of ELN_WRITEUP_API_EXTRACT are
+recomputed from the normalized text in the same update, as they are for rows
+normalized at ingestion, so LSH candidates of old and new rows are comparable.
+
+Usage:
+    python backfill_normalized_text.py -t ELN_WRITEUP_API_EXTRACT ELN_WRITEUP_SCRAPPED
+"""
+
+import argparse
+import psycopg2
+import psycopg2.extras
+from os import getenv
+from dotenv import load_dotenv
+from compare_modules import normalize_writeup
+from minhash_lsh import minhash_signature, signature_to_bytes
+
+
+load_dotenv(override=True)
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+TABLE_KEYS = {
+    "ELN_WRITEUP_API_EXTRACT": ("exp_id", "system_name", "analysis_date"),
+    "ELN_WRITEUP_SCRAPPED": ("exp_id", "system_name"),
+}
+# tables whose minhash column is signed from the normalized text
+MINHASH_TABLES = {"ELN_WRITEUP_API_EXTRACT"}
+
+
+def backfill(table, batch_size=1000):
+    """
+    Normalize and store the writeups of one table that have no normalized_text.
+
+    Args:
+        table (str): One of TABLE_KEYS.
+        batch_size (int): Rows fetched and updated per round trip.
+    """
+    keys = TABLE_KEYS[table]
+    connection = psycopg2.connect(**DB_CONFIG)
+    read_cursor = connection.cursor(name=f"backfill_{table.lower()}", withhold=True)
+    read_cursor.itersize = batch_size
+    read_cursor.execute(
+        f"SELECT {', '.join(keys)}, write_up FROM {table} WHERE normalized_text IS NULL"
+    )
+    signed = table in MINHASH_TABLES
+    query = (
+        f"UPDATE {table} SET normalized_text = %s"
+        + (", minhash = %s" if signed else "")
+        + " WHERE "
+        + " AND ".join(f"{key} = %s" for key in keys)
+    )
+    cursor = connection.cursor()
+    total = 0
+    while True:
+        batch = read_cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        rows = []
+        for row in batch:
+            normalized_text = normalize_writeup(row[-1])
+            if signed:
+                signature = psycopg2.Binary(signature_to_bytes(minhash_signature(normalized_text)))
+                rows.append((normalized_text, signature, *row[:-1]))
+            else:
+                rows.append((normalized_text, *row[:-1]))
+        psycopg2.extras.execute_batch(cursor, query, rows)
+        connection.commit()
+        total += len(batch)
+        print(f"{table}: {total} rows normalized...")
+    read_cursor.close()
+    cursor.close()
+    connection.close()
+    print(f"{table}: {total} rows backfilled")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfill normalized_text for stored ELN writeups"
+    )
+    parser.add_argument(
+        "-t",
+        "--tables",
+        nargs="+",
+        choices=list(TABLE_KEYS),
+        default=list(TABLE_KEYS),
+        help="Tables to backfill",
+    )
+    parser.add_argument(
+        "-b", "--batch_size", type=int, default=1000, help="Rows per batch"
+    )
+    args = parser.parse_args()
+    for table in args.tables:
+        backfill(table, args.batch_size)
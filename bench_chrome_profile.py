@@ -0,0 +1,128 @@
+"""
+Time page loads of the Chrome profiles in driver_pool on saved pages.
+
+The saved pages (every html file under the directory, with any assets next to
+them; the fixture_replay sample fixtures by default) are served from a local
+HTTP server, optionally with an artificial per-request latency to approximate
+the real domains. Each profile starts one driver, warms it up on the first page
+and then loads every page with it, as a pooled driver would. Reported per
+profile: mean and median driver.get time, time until the samplenotebook
+Textarea block is present and pages/sec.
+
+Usage:
+    python bench_chrome_profile.py -r 3 --latency 50
+    python bench_chrome_profile.py -d saved_pages
+"""
+
+import time
+import argparse
+import tempfile
+import threading
+from os import walk, path
+from statistics import mean, median
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+from driver_pool import create_driver, PROFILES
+from fixture_replay import DEFAULT_FIXTURES
+
+
+class LatencyHandler(SimpleHTTPRequestHandler):
+    latency = 0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory, latency):
+    """
+    Serve the directory on a free local port in a background thread.
+
+    Returns:
+        ThreadingHTTPServer
+    """
+    handler = type("Handler", (LatencyHandler,), {"latency": latency / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_profile(profile, urls, rounds):
+    """
+    Load every url rounds times with one driver of the profile.
+
+    Returns:
+        tuple: (list of driver.get seconds, list of seconds until the Textarea block)
+    """
+    with tempfile.TemporaryDirectory() as user_data_dir:
+        driver = create_driver(profile, user_data_dir)
+        try:
+            # first load warms up the driver and, for the fast profile, the disk cache
+            driver.get(urls[0])
+            load_times, ready_times = [], []
+            for _ in range(rounds):
+                for url in urls:
+                    start = time.perf_counter()
+                    driver.get(url)
+                    load_times.append(time.perf_counter() - start)
+                    try:
+                        WebDriverWait(driver, 10).until(
+                            EC.presence_of_element_located(
+                                (By.XPATH, "//div[@data-customlabel='Textarea']")
+                            )
+                        )
+                    except TimeoutException:
+                        pass
+                    ready_times.append(time.perf_counter() - start)
+            return load_times, ready_times
+        finally:
+            driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare page load times of the Chrome profiles on saved pages"
+    )
+    parser.add_argument(
+        "-d", "--directory", default=DEFAULT_FIXTURES, help="Directory of saved html pages, searched recursively"
+    )
+    parser.add_argument("-r", "--rounds", type=int, default=3, help="Loads of every page per profile")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Artificial latency per request in milliseconds"
+    )
+    parser.add_argument(
+        "-p", "--profiles", nargs="+", choices=PROFILES, default=list(PROFILES), help="Profiles to time"
+    )
+    args = parser.parse_args()
+
+    pages = sorted(
+        path.relpath(path.join(root, name), args.directory).replace(path.sep, "/")
+        for root, _, names in walk(args.directory)
+        for name in names
+        if name.endswith(".html")
+    )
+    if not pages:
+        raise SystemExit(f"No saved .html pages in {args.directory}")
+    server = serve(path.abspath(args.directory), args.latency)
+    urls = [f"http://127.0.0.1:{server.server_port}/{page}" for page in pages]
+    try:
+        print(f"{'profile':<10} {'mean load':>10} {'median load':>12} {'mean ready':>11} {'pages/s':>8}")
+        for profile in args.profiles:
+            load_times, ready_times = time_profile(profile, urls, args.rounds)
+            print(
+                f"{profile:<10} {mean(load_times) * 1000:>8.0f}ms {median(load_times) * 1000:>10.0f}ms "
+                f"{mean(ready_times) * 1000:>9.0f}ms {len(ready_times) / sum(ready_times):>8.2f}"
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark the writeup extraction on saved page fixtures, without Dotmatics access.
+
+Every fixture page (each experiment for each domain) is extracted and checked
+against its expected.json: created date, which chemical tables were found and
+the normalized writeup text. Modes:
+
+    parse: writeup_parser on the saved iframe html only.
+    http: Fetched from the local replay server through HttpFetcher, then parsed.
+    browser: Loaded from the replay server through a DriverPool, as in the
+        scraper, then parsed (needs Chrome).
+
+Usage:
+    python bench_scraper.py -m parse -r 20
+    python bench_scraper.py -m http -w 8
+    python bench_scraper.py -m browser -w 2 --profile fast
+"""
+
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from compare_modules import normalize_writeup
+from writeup_parser import parse_notebook, TABLE_LABELS
+from fixture_replay import (
+    load_fixtures,
+    notebook_html,
+    expected_for,
+    serve,
+    base_url_template,
+    DEFAULT_FIXTURES,
+)
+
+
+DOMAINS = ["prelude-masks", "prelude-masks2"]
+PATH_URL_TEMPLATE = "/testmanager/experiment.jsp?experiment_id={0}&action=edit&tab=notebook"
+
+
+def check(notebook, expected):
+    """
+    Fields of the extraction that differ from the expected extraction.
+
+    Returns:
+        list: Names of the mismatched fields.
+    """
+    actual = {
+        "created_date": notebook["created_date"].strftime("%Y-%m-%d")
+        if notebook["created_date"]
+        else None,
+        "tables": [label for label in TABLE_LABELS if notebook["tables"][label]],
+        "normalized_text": normalize_writeup(notebook["write_up"])
+        if notebook["write_up"] is not None
+        else None,
+    }
+    return [field for field in actual if field in expected and actual[field] != expected[field]]
+
+
+def browser_fetch(pools):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    def fetch(exp_id, domain):
+        with pools[domain].driver() as driver:
+            driver.get(pools[domain].base_url + PATH_URL_TEMPLATE.format(exp_id))
+            WebDriverWait(driver, 20).until(
+                EC.presence_of_element_located((By.ID, "samplenotebookiframe"))
+            )
+            driver.switch_to.frame(driver.find_element(By.ID, "samplenotebookiframe"))
+            html = driver.page_source
+            driver.switch_to.default_content()
+            return html
+
+    return fetch
+
+
+def run(mode, fixtures, domains, rounds, workers, profile):
+    """
+    Extract every fixture page rounds times.
+
+    Returns:
+        tuple: (seconds, list of (exp_id, domain, mismatched fields))
+    """
+    sessions = {}
+    server = None
+    if mode == "parse":
+        fetch = lambda exp_id, domain: notebook_html(fixtures[exp_id], domain)
+    else:
+        server = serve(fixtures)
+        if mode == "http":
+            from http_scraper import HttpFetcher
+
+            sessions = {
+                domain: HttpFetcher(
+                    base_url_template(server).format(domain),
+                    "user",
+                    "pass",
+                    login_mode="form",
+                    connections=workers,
+                )
+                for domain in domains
+            }
+            fetch = lambda exp_id, domain: sessions[domain].notebook_html(
+                PATH_URL_TEMPLATE.format(exp_id)
+            )
+        else:
+            from driver_pool import DriverPool
+
+            sessions = {
+                domain: DriverPool(
+                    base_url_template(server).format(domain), "user", "pass", size=workers, profile=profile
+                )
+                for domain in domains
+            }
+            fetch = browser_fetch(sessions)
+
+    def extract(exp_id, domain):
+        notebook = parse_notebook(fetch(exp_id, domain), exp_id)
+        expected = expected_for(fixtures[exp_id], domain)
+        return exp_id, domain, check(notebook, expected) if expected else []
+
+    pages = [(exp_id, domain) for exp_id in fixtures for domain in domains] * rounds
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda page: extract(*page), pages))
+        seconds = time.perf_counter() - start
+    finally:
+        for session in sessions.values():
+            session.close()
+        if server:
+            server.shutdown()
+    return seconds, results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark writeup extraction on saved page fixtures"
+    )
+    parser.add_argument("-d", "--directory", default=DEFAULT_FIXTURES, help="Fixture directory")
+    parser.add_argument(
+        "-m", "--mode", choices=["parse", "http", "browser"], default="parse", help="How pages are fetched"
+    )
+    parser.add_argument("-r", "--rounds", type=int, default=1, help="Passes over the fixtures")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Concurrent extractions")
+    parser.add_argument("--domains", nargs="+", default=DOMAINS, help="Domains to fetch every experiment from")
+    parser.add_argument(
+        "--profile", choices=["default", "fast"], default="default", help="Chrome profile in browser mode"
+    )
+    args = parser.parse_args()
+    # missing tables are logged per page by the parser; the summary reports them
+    logging.disable(logging.ERROR)
+
+    fixtures = load_fixtures(args.directory)
+    if not fixtures:
+        raise SystemExit(f"No fixtures in {args.directory}")
+    seconds, results = run(args.mode, fixtures, args.domains, args.rounds, args.workers, args.profile)
+    failures = sorted({(exp_id, domain, tuple(fields)) for exp_id, domain, fields in results if fields})
+    correct = sum(not fields for _, _, fields in results)
+    print(
+        f"{args.mode}: {len(results)} pages in {seconds:.2f}s ({len(results) / seconds:.1f} pages/s), "
+        f"{correct}/{len(results)} extracted correctly"
+    )
+    for exp_id, domain, fields in failures:
+        print(f"  {exp_id} {domain}: {', '.join(fields)} mismatched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark the similarity engines in compare_modules on long writeup fixtures.
+
+Fixtures are generated deterministically from a seed: a synthetic writeup of the
+requested length, and a copy with a given fraction of its words edited (numbers
+changed, words dropped or inserted), both as a single paragraph and split into
+lines. Each engine is timed and its match percentage compared with the legacy
+character-level SequenceMatcher, including agreement on is_match.
+
+Agreement is also reported against the exact ratio (SequenceMatcher without its
+junk heuristic). On writeups longer than 200 characters the heuristic junks the
+most frequent characters and legacy under-reports similarity (e.g. ~34% for a
+2000 character writeup with 5% of its words edited), which is where the other
+engines disagree with legacy; they agree with the exact ratio instead.
+
+Usage:
+    python bench_similarity.py -s 2000 8000 20000 -r 0.01 0.05 0.2
+"""
+
+import argparse
+import random
+import time
+from statistics import mean
+from difflib import SequenceMatcher
+from compare_modules import similarity, ENGINES, MATCH_THRESHOLD
+
+
+VOCAB = (
+    "To a stirred solution of tert-butyl 4-chloro-piperidine-1-carboxylate in "
+    "1,4-Dioxane and Water was added Potassium phosphate tribasic under N2 "
+    "atmosphere. The mixture was heated to 100 °C for 30 min. LC-MS confirmed the "
+    "consumption of the SM and the formation of the desired product. The organic "
+    "phase was separated, dried over Na2SO4, concentrated and purified by flash "
+    "column chromatography (0%-20% MeOH/DCM) to give the title compound as a "
+    "brown solid {{1080:uid 1}}_XXXXX_"
+).split()
+
+
+def make_writeup(length, rng):
+    """
+    Synthetic writeup of approximately `length` characters.
+    """
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(VOCAB)
+        if rng.random() < 0.1:
+            word = f"({rng.uniform(1, 5000):.2f} mg, {rng.uniform(0.1, 50):.2f} mmol)"
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def edit_writeup(writeup, rate, rng):
+    """
+    Copy of the writeup with roughly `rate` of its words edited.
+    """
+    words = []
+    for word in writeup.split(" "):
+        roll = rng.random()
+        if roll >= rate:
+            words.append(word)
+        elif roll < rate / 3:
+            words.append(word.replace("0", "?").replace("5", "?") or "?")
+        elif roll < 2 * rate / 3:
+            continue
+        else:
+            words += [word, rng.choice(VOCAB)]
+    return " ".join(words)
+
+
+def split_lines(writeup, words_per_line=40):
+    """
+    Split a single paragraph writeup into lines of `words_per_line` words.
+    """
+    words = writeup.split(" ")
+    return "\n".join(
+        " ".join(words[i : i + words_per_line])
+        for i in range(0, len(words), words_per_line)
+    )
+
+
+def make_fixtures(sizes, rates, seed):
+    """
+    Yield (label, writeup1, writeup2) fixtures.
+    """
+    rng = random.Random(seed)
+    for size in sizes:
+        for rate in rates:
+            writeup1 = make_writeup(size, rng)
+            writeup2 = edit_writeup(writeup1, rate, rng)
+            yield f"{size:>6} chars {rate:>5.0%} edits single", writeup1, writeup2
+            yield (
+                f"{size:>6} chars {rate:>5.0%} edits lines ",
+                split_lines(writeup1),
+                split_lines(writeup2),
+            )
+
+
+def run(sizes, rates, engines, repeat, seed, threshold):
+    results = {
+        engine: {"times": [], "errors": [], "agree": 0, "agree_exact": 0}
+        for engine in engines
+    }
+    n_fixtures = 0
+    header = f"{'Fixture':<34}" + "".join(f"{engine:>22}" for engine in engines)
+    print(header)
+    print("-" * len(header))
+
+    for label, writeup1, writeup2 in make_fixtures(sizes, rates, seed):
+        n_fixtures += 1
+        row = f"{label:<34}"
+        reference = None
+        exact = SequenceMatcher(None, writeup1, writeup2, autojunk=False).ratio() * 100
+        for engine in engines:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                _, match_percentage = similarity(writeup1, writeup2, engine)
+            elapsed = (time.perf_counter() - start) / repeat
+            if reference is None:
+                reference = similarity(writeup1, writeup2, "legacy")[1]
+            results[engine]["times"].append(elapsed)
+            results[engine]["errors"].append(abs(match_percentage - reference))
+            results[engine]["agree"] += (match_percentage >= threshold) == (
+                reference >= threshold
+            )
+            results[engine]["agree_exact"] += (match_percentage >= threshold) == (
+                exact >= threshold
+            )
+            row += f"{elapsed * 1000:>10.1f} ms {match_percentage:>7.2f}%"
+        print(row)
+
+    print()
+    print(
+        f"{'Engine':<14}{'mean ms':>10}{'speedup':>10}{'mean |Δ%|':>12}"
+        f"{'agree legacy':>16}{'agree exact':>16}"
+    )
+    legacy_time = mean(results["legacy"]["times"]) if "legacy" in results else None
+    for engine in engines:
+        mean_time = mean(results[engine]["times"])
+        speedup = f"{legacy_time / mean_time:.1f}x" if legacy_time else "-"
+        print(
+            f"{engine:<14}{mean_time * 1000:>10.1f}{speedup:>10}"
+            f"{mean(results[engine]['errors']):>12.2f}"
+            f"{results[engine]['agree']:>10}/{n_fixtures}"
+            f"{results[engine]['agree_exact']:>13}/{n_fixtures}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark similarity engines against the legacy match_percentage"
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=[2000, 8000, 20000],
+        help="Writeup lengths in characters",
+    )
+    parser.add_argument(
+        "-r",
+        "--rates",
+        nargs="+",
+        type=float,
+        default=[0.01, 0.05, 0.2],
+        help="Fraction of words edited in the second writeup",
+    )
+    parser.add_argument(
+        "-e",
+        "--engines",
+        nargs="+",
+        choices=ENGINES,
+        default=list(ENGINES),
+        help="Engines to benchmark",
+    )
+    parser.add_argument(
+        "-n", "--repeat", type=int, default=1, help="Timing repetitions per fixture"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Fixture random seed")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=MATCH_THRESHOLD,
+        help=f"is_match threshold for the agreement check, defaults to {MATCH_THRESHOLD}",
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.rates, args.engines, args.repeat, args.seed, args.threshold)
@@ -12,9 +12,12 @@ Text Comparison:
         Diff: Executes a diff between the two writeups similar to git diff.
         SciBERT: Utilizes a pre-trained BERT model fine-tuned on scientific literature.
         TF-IDF: Applies vector-based similarity on word importance.
+    Pairs go through the tiered cascade in compare_modules; only pairs ambiguous
+    against the is_match threshold are scored with SciBERT and TF-IDF.
 
 Asynchronous Processing:
     Uses Python’s asyncio to parallelize API calls and efficiently process a large number of experiments.
+    Comparisons run off the event loop on a process pool (compare_pool) with pinned torch threads.
 """
 
 import psycopg2
@@ -28,8 +31,19 @@ import asyncpg
 import json
 from time import sleep
 from datetime import date, datetime
-from difflib import unified_diff, SequenceMatcher
-from ml_modules import scibert_compare, tfidf_compare
+from compare_modules import (
+    compare_writeups,
+    normalize_writeup,
+    format_tier_counts,
+    new_tier_counts,
+    MATCH_THRESHOLD,
+    AMBIGUITY_MARGIN,
+    ENGINES,
+    DEFAULT_ENGINE,
+)
+from minhash_lsh import minhash_signature, signature_to_bytes
+from compare_pool import create_pool, compare_batch, autotune, DEFAULT_BATCH_SIZE
+from compr_summary import create_summary
 
 
 load_dotenv(override=True)
@@ -44,6 +58,7 @@ DS_IDS = {
 BASE_URL = "dotmatics.net/browser/api"
 EXPIRE = 12 * 60 * 60
 DB_POOL = None
+COMPARE_POOL = None
 DB_CONFIG = {
     "dbname": getenv("DB_NAME"),
     "user": getenv("DB_USER"),
@@ -52,6 +67,7 @@ DB_CONFIG = {
     "port": getenv("DB_PORT"),
 }
 exp_id_list = []
+tier_counts = new_tier_counts()
 
 
 async def init_db(max_size: int):
@@ -85,6 +101,7 @@ def create_tables(delete=False, cont=True):
     if delete:
         cursor.execute("DROP TABLE IF EXISTS ELN_WRITEUP_API_EXTRACT CASCADE")
         cursor.execute("DROP TABLE IF EXISTS ELN_WRITEUP_COMPARISON CASCADE")
+        cursor.execute("DROP TABLE IF EXISTS ELN_WRITEUP_COMPARISON_SUMMARY")
     else:
         cursor.execute(
             """
@@ -92,8 +109,10 @@ def create_tables(delete=False, cont=True):
                 exp_id VARCHAR(7) NOT NULL,
                 system_name VARCHAR(100) NOT NULL,
                 write_up TEXT NOT NULL,
+                normalized_text TEXT,
                 summary_data TEXT NOT NULL,
                 analysis_date DATE NOT NULL,
+                minhash BYTEA,
                 PRIMARY KEY(exp_id, system_name, analysis_date)
             );
         """
@@ -110,11 +129,13 @@ def create_tables(delete=False, cont=True):
                 scibert_score NUMERIC,
                 tfidf_score NUMERIC,
                 analysis_date DATE NOT NULL,
+                compare_tier VARCHAR(20),
                 PRIMARY KEY (exp_id, system_name_1, system_name_2, analysis_date),
                 FOREIGN KEY (exp_id, system_name_1, analysis_date) REFERENCES eln_writeup_api_extract (exp_id, system_name, analysis_date)
             );
         """
         )
+        create_summary(cursor)
     if cont and not delete:
         cursor.execute(
             "SELECT distinct exp_id from ELN_WRITEUP_API_EXTRACT WHERE analysis_date >= CURRENT_DATE - INTERVAL '2 days'"
@@ -160,7 +181,8 @@ async def fetch_post(url, headers, data):
 
 async def save_writeup_to_db(exp_id, system_name, writeup, summary, analysis_date):
     """
-    Saves writeup data to the database.
+    Saves writeup data to the database, along with its normalized text and
+    MinHash signature.
 
     Args:
         exp_id (str): Experiment ID.
@@ -168,19 +190,26 @@ async def save_writeup_to_db(exp_id, system_name, writeup, summary, analysis_dat
         writeup (str): The writeup content.
         summary (dict): Summary data.
         analysis_date (date): Date analysed.
+
+    Returns:
+        str: The normalized writeup text.
     """
+    normalized_text = normalize_writeup(writeup)
     async with DB_POOL.acquire() as conn:
         await conn.execute(
             """
-            INSERT INTO ELN_WRITEUP_API_EXTRACT (exp_id, system_name, write_up, summary_data, analysis_date)
-            VALUES ($1, $2, $3, $4, $5)
+            INSERT INTO ELN_WRITEUP_API_EXTRACT (exp_id, system_name, write_up, normalized_text, summary_data, analysis_date, minhash)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
             """,
             exp_id,
             system_name,
             writeup,
+            normalized_text,
             summary,
             analysis_date,
+            signature_to_bytes(minhash_signature(normalized_text)),
         )
+    return normalized_text
 
 
 async def save_compr_to_db(
@@ -193,6 +222,7 @@ async def save_compr_to_db(
     scibert_score,
     tfidf_score,
     analysis_date,
+    compare_tier,
 ):
     """
     Saves comparison data to the database.
@@ -207,12 +237,13 @@ async def save_compr_to_db(
         scibertt_score (float): scibert model cosine similarity score.
         tfidf_score (float): tf-idf model cosine similarity score.
         analysis_date (date): Date analysed.
+        compare_tier (str): Cascade tier that decided the comparison.
     """
     async with DB_POOL.acquire() as conn:
         await conn.execute(
             """
-            INSERT INTO ELN_WRITEUP_COMPARISON (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score, analysis_date)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            INSERT INTO ELN_WRITEUP_COMPARISON (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score, analysis_date, compare_tier)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
             """,
             exp_id,
             system_name_1,
@@ -223,6 +254,7 @@ async def save_compr_to_db(
             scibert_score,
             tfidf_score,
             analysis_date,
+            compare_tier,
         )
 
 
@@ -279,7 +311,9 @@ async def update_compr(
 
 
 async def fetch_write_up(exp_id: str, system_name: str, analysis_date: date):
-    """Fetch the write_up from eln_writeup_api_extract based on exp_id and system_name.
+    """Fetch the normalized write_up from eln_writeup_api_extract based on exp_id and system_name.
+
+    Rows stored before the normalized_text column existed are normalized on the fly.
 
     Args:
         exp_id (str): Experiment ID.
@@ -287,9 +321,9 @@ async def fetch_write_up(exp_id: str, system_name: str, analysis_date: date):
         analysis_date (date): Date analysed.
     """
     async with DB_POOL.acquire() as conn:
-        return await conn.fetchval(
+        row = await conn.fetchrow(
             """
-            SELECT write_up
+            SELECT normalized_text, write_up
             FROM eln_writeup_api_extract
             WHERE exp_id = $1 AND system_name = $2
             AND analysis_date = $3
@@ -298,11 +332,48 @@ async def fetch_write_up(exp_id: str, system_name: str, analysis_date: date):
             system_name,
             analysis_date,
         )
+    if row is None:
+        return ""
+    if row["normalized_text"] is None:
+        return normalize_writeup(row["write_up"])
+    return row["normalized_text"]
+
+
+async def compare_chunk(pairs, cascade):
+    """
+    Compare writeup pairs on the comparison process pool, in batches, without
+    blocking the event loop. Falls back to comparing in-process without a pool.
+
+    Args:
+        pairs (list): (writeup1, writeup2) tuples.
+        cascade (dict): Keyword arguments (threshold, margin, engine) for compare_writeups.
+
+    Returns:
+        list: Result dicts from compare_writeups, in the order of pairs.
+    """
+    if COMPARE_POOL is None:
+        return [
+            compare_writeups(writeup1, writeup2, counts=tier_counts, **cascade)
+            for writeup1, writeup2 in pairs
+        ]
+    futures = [
+        asyncio.wrap_future(
+            COMPARE_POOL.submit(
+                compare_batch, pairs[i : i + DEFAULT_BATCH_SIZE], cascade
+            )
+        )
+        for i in range(0, len(pairs), DEFAULT_BATCH_SIZE)
+    ]
+    results = []
+    for batch_results, batch_counts in await asyncio.gather(*futures):
+        results += batch_results
+        tier_counts.update(batch_counts)
+    return results
 
 
 # async def process_exp_id(exp_id_chunk, semaphore, analysis_date_1, analysis_date_2):
 async def process_exp_id(
-    token_dct, exp_id_chunk, semaphore, analysis_date_1, analysis_date_2
+    token_dct, exp_id_chunk, semaphore, analysis_date_1, analysis_date_2, cascade
 ):
     """
     Processes an individual experiment ID by fetching data, computing differences,
@@ -314,6 +385,7 @@ async def process_exp_id(
         semaphore (semphore): The semaphore object that is based on limited concurrent tasks.
         analysis_date_1 (date): First date analysed.
         analysis_date_2 (date): Second date analysed, as comparator.
+        cascade (dict): Keyword arguments (threshold, margin, engine) for compare_writeups.
     """
 
     async with semaphore:
@@ -339,6 +411,7 @@ async def process_exp_id(
                 sdata.setdefault(sname, {})[primary] = json.dumps(ds_summary)
 
         # second request writeup data for single exp_id using get request
+        compr_pairs = {}
         for exp_id in exp_id_chunk:
             compr_data = {}
 
@@ -347,11 +420,11 @@ async def process_exp_id(
                 writeup_url_endpoint = f"https://{sname}.{BASE_URL}/studies/experiment/{exp_id}/writeup/{{includeHtml}}"
                 headers = {"Authorization": f"Dotmatics {token_dct[sname]}"}
                 writeup_data = await fetch_get(writeup_url_endpoint, headers)
-                compr_data[sname] = {"writeup": writeup_data}
 
-                await save_writeup_to_db(
+                normalized_text = await save_writeup_to_db(
                     exp_id, sname, writeup_data, sdata[sname][exp_id], analysis_date_1
                 )
+                compr_data[sname] = {"writeup": normalized_text}
 
             writeup1 = compr_data[SYS_NAMES[0]]["writeup"]
             # writeup2 = compr_data[SYS_NAMES[2]]["writeup"]
@@ -359,16 +432,12 @@ async def process_exp_id(
             # for exp_id in exp_id_chunk:
             # writeup1 = await fetch_write_up(exp_id, SYS_NAMES[1], analysis_date_1)
             writeup2 = await fetch_write_up(exp_id, SYS_NAMES[1], analysis_date_2)
+            compr_pairs[exp_id] = (writeup1, writeup2)
 
-            diff = "\n".join(
-                unified_diff(writeup1.splitlines(), writeup2.splitlines(), lineterm="")
-            )
-            matcher = SequenceMatcher(None, writeup1, writeup2)
-            match_percentage = matcher.ratio() * 100
-            is_match = match_percentage >= 97
+        # score the whole chunk on the comparison pool
+        results = await compare_chunk(list(compr_pairs.values()), cascade)
 
-            scibert_score = float(scibert_compare(writeup1, writeup2))
-            tfidf_score = float(tfidf_compare(writeup1, writeup2))
+        for exp_id, result in zip(compr_pairs, results):
 
             # await update_compr(
             #     exp_id,
@@ -386,18 +455,19 @@ async def process_exp_id(
                 exp_id,
                 SYS_NAMES[0],
                 SYS_NAMES[1],
-                diff,
-                match_percentage,
-                is_match,
-                scibert_score,
-                tfidf_score,
+                result["diff"],
+                result["match_percentage"],
+                result["is_match"],
+                result["scibert_score"],
+                result["tfidf_score"],
                 analysis_date_1,
+                result["tier"],
             )
 
             await asyncio.sleep(0.1)
 
 
-async def main(limit: int, max_size: int, cardinal: int, cont: bool):
+async def main(limit: int, max_size: int, cardinal: int, cont: bool, cascade: dict, workers: int, threads: int):
     """
     Main function to handle the asynchronous logic for fetching, comparing,
     and saving data.
@@ -406,9 +476,19 @@ async def main(limit: int, max_size: int, cardinal: int, cont: bool):
         limit (int): Limit the number of experiment ids fetched
         max_size (int): Max number of connections in the pool
         cardinal (int): Max number of concurrent asyncio tasks and semaphores
+        cascade (dict): Keyword arguments (threshold, margin, engine) for compare_writeups
+        workers (int): Comparison worker processes, 0 to compare in-process
+            with a single model
+        threads (int): torch threads per comparison worker
     """
-    global exp_id_list 
+    global exp_id_list, COMPARE_POOL
     await init_db(max_size)
+    if workers:
+        # starting the workers loads one SciBERT model each; keep the loop responsive
+        COMPARE_POOL = await asyncio.get_running_loop().run_in_executor(
+            None, create_pool, workers, threads
+        )
+        print("Comparison pool started")
     semaphore = asyncio.Semaphore(cardinal)
     chunk_size = cardinal
     tasks = []
@@ -503,6 +583,7 @@ async def main(limit: int, max_size: int, cardinal: int, cont: bool):
                 semaphore,
                 analysis_date_1,
                 analysis_date_2,
+                cascade,
             )
         )
         # tasks.append(process_exp_id(chunk, semaphore, analysis_date_1, analysis_date_2))
@@ -510,10 +591,14 @@ async def main(limit: int, max_size: int, cardinal: int, cont: bool):
         print(f"Asyncio processing {chunk_size} experiment IDs...")
         await asyncio.gather(*tasks)
         print("All Asyncio tasks completed")
+        print(f"Comparison tiers: {format_tier_counts(tier_counts)}")
         tasks.clear()
 
     await DB_POOL.close()
     print("Database connection pool closed")
+    if COMPARE_POOL is not None:
+        COMPARE_POOL.shutdown()
+        print("Comparison pool closed")
 
 
 if __name__ == "__main__":
@@ -554,7 +639,50 @@ if __name__ == "__main__":
         action="store_false",
         help="Specify whether to continue from where left off from the PostgreSQL database. If not provided, defaults to continue (True).",
     )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        default=MATCH_THRESHOLD,
+        type=float,
+        help=f"Specify the match percentage threshold for is_match; defaults to {MATCH_THRESHOLD}.",
+    )
+    parser.add_argument(
+        "--margin",
+        default=AMBIGUITY_MARGIN,
+        type=float,
+        help=f"Specify the margin around the threshold within which pairs are escalated to SciBERT and TF-IDF; defaults to {AMBIGUITY_MARGIN}.",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        default=DEFAULT_ENGINE,
+        choices=ENGINES,
+        help=f"Specify the similarity engine for the match percentage; defaults to {DEFAULT_ENGINE}.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=0,
+        help="Specify the number of comparison worker processes, each loading its own SciBERT model; defaults to 0, comparing in-process.",
+    )
+    parser.add_argument(
+        "-n",
+        "--threads",
+        type=int,
+        help="Specify the number of torch threads per comparison worker; defaults to cores divided by workers.",
+    )
+    parser.add_argument(
+        "-a",
+        "--autotune",
+        action="store_true",
+        help="Benchmark worker/thread configurations on this machine and use the fastest.",
+    )
     args = parser.parse_args()
     create_tables(delete=args.delete, cont=args.continue_flag)
     if not args.delete:
-        asyncio.run(main(args.limit, int(args.max_size), int(args.semaphore), bool(args.continue_flag)))
+        cascade = {"threshold": args.threshold, "margin": args.margin, "engine": args.engine}
+        workers, threads = args.workers, args.threads
+        if args.autotune:
+            workers, threads = autotune(cascade=cascade)
+        asyncio.run(main(args.limit, int(args.max_size), int(args.semaphore), bool(args.continue_flag), cascade, workers, threads))
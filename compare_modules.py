@@ -0,0 +1,322 @@
+"""
+Tiered comparison cascade for ELN writeups.
+
+Each writeup pair is decided by the cheapest tier that can settle it against
+the is_match threshold; only pairs left ambiguous by the full ratio are
+escalated to the SciBERT and TF-IDF models.
+
+Tiers (in order):
+    hash: Exact sha256 equality of the raw writeups.
+    normalized: Equality after whitespace/invisible character cleanup.
+    bound: real_quick_ratio/quick_ratio upper bounds already below the threshold;
+        legacy engine only, as they only bound the SequenceMatcher ratio. The
+        bound is stored as the match percentage.
+    ratio: Full similarity ratio clearly on one side of the threshold.
+    model: Ratio within the ambiguity margin, scored with SciBERT and TF-IDF.
+
+Similarity engines (for the full ratio):
+    legacy: Character-level SequenceMatcher with the default junk heuristic.
+    line: Line-level matching only; replaced lines count as unmatched.
+    token: Line-level matching, then token-level matching inside replaced lines.
+    bitparallel: Line-level matching, then a bit-parallel LCS over the characters
+        of replaced lines (linear space, O(n*m/w) time).
+The non-legacy engines build the unified diff and the match percentage from the
+same line-level pass; every line is counted with its line break. The legacy
+engine's junk heuristic drops frequent characters on writeups longer than 200
+characters, so it under-reports their similarity; the other engines do not, and
+will flip is_match on such pairs compared with stored legacy results.
+"""
+
+import re
+import html
+import hashlib
+from collections import Counter
+from difflib import unified_diff, SequenceMatcher
+
+
+TIERS = ("hash", "normalized", "bound", "ratio", "model")
+ENGINES = ("legacy", "line", "token", "bitparallel")
+DEFAULT_ENGINE = "legacy"
+MATCH_THRESHOLD = 97
+AMBIGUITY_MARGIN = 2.0
+DIFF_CONTEXT = 3
+
+_whitespace_regex = re.compile(r"\s+")
+_html_drop_regex = re.compile(
+    r"<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>", re.DOTALL | re.IGNORECASE
+)
+_html_break_regex = re.compile(
+    r"<br\s*/?>|</(?:p|div|li|tr|h[1-6])\s*>", re.IGNORECASE
+)
+_html_tag_regex = re.compile(r"</?[A-Za-z][^<>]*>")
+_inline_space_regex = re.compile(r"[^\S\n]+")
+_newline_regex = re.compile(r" ?\n\s*")
+_invisible_chars = str.maketrans(
+    {
+        "\r": "",  # Windows-style line endings
+        "\u200b": "",  # zero-width space
+        "\u00AD": "",  # soft hyphen
+        "\u00A0": " ",  # non-breaking space
+    }
+)
+
+
+def normalize_text(text):
+    """
+    Remove invisible characters and collapse runs of whitespace.
+    """
+    return _whitespace_regex.sub(" ", text.translate(_invisible_chars)).strip()
+
+
+def normalize_writeup(text):
+    """
+    Normalization stage run once at ingestion; its output is stored in the
+    normalized_text columns and read by comparisons and reports.
+
+    Strips HTML tags (line breaking tags become newlines), unescapes entities,
+    removes invisible characters and collapses whitespace while keeping single
+    line breaks so line-based diffs stay readable.
+    """
+    if not text:
+        return ""
+    if "<" in text:
+        text = _html_drop_regex.sub(" ", text)
+        text = _html_break_regex.sub("\n", text)
+        text = _html_tag_regex.sub(" ", text)
+    if "&" in text:
+        text = html.unescape(text)
+    text = _inline_space_regex.sub(" ", text.translate(_invisible_chars))
+    return _newline_regex.sub("\n", text).strip()
+
+
+def text_hash(text):
+    """
+    sha256 hex digest of the text, used for the exact equality tier.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _format_range(start, stop):
+    """
+    Unified diff hunk range, as formatted by difflib.unified_diff.
+    """
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def _unified_diff_from_opcodes(lines1, lines2, grouped_opcodes):
+    """
+    Render grouped opcodes of a line matcher the same way as
+    difflib.unified_diff(lines1, lines2, lineterm="").
+    """
+    diff_lines = []
+    for group in grouped_opcodes:
+        if not diff_lines:
+            diff_lines += ["--- ", "+++ "]
+        first, last = group[0], group[-1]
+        diff_lines.append(
+            f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@"
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                diff_lines += [" " + line for line in lines1[i1:i2]]
+                continue
+            if tag in ("replace", "delete"):
+                diff_lines += ["-" + line for line in lines1[i1:i2]]
+            if tag in ("replace", "insert"):
+                diff_lines += ["+" + line for line in lines2[j1:j2]]
+    return "\n".join(diff_lines)
+
+
+def lcs_length(text1, text2):
+    """
+    Length of the longest common subsequence of two strings.
+
+    Bit-parallel formulation (Allison-Dix/Hyyro): the shorter string is encoded
+    as per-character bitmasks and each character of the longer string updates a
+    single bit-vector, using Python integers as arbitrary width words.
+    """
+    if len(text1) < len(text2):
+        text1, text2 = text2, text1
+    if not text2:
+        return 0
+    masks = {}
+    for i, char in enumerate(text2):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    full = (1 << len(text2)) - 1
+    vector = full
+    for char in text1:
+        matches = vector & masks.get(char, 0)
+        vector = ((vector + matches) | (vector - matches)) & full
+    return len(text2) - bin(vector).count("1")
+
+
+def _token_matches(text1, text2):
+    """
+    Number of characters in the matching word blocks of two strings, each word
+    counted with its trailing separator, at most the length of either string.
+    """
+    tokens1 = text1.split()
+    tokens2 = text2.split()
+    matcher = SequenceMatcher(None, tokens1, tokens2, autojunk=False)
+    matched = sum(
+        len(token) + 1
+        for i, _, size in matcher.get_matching_blocks()
+        for token in tokens1[i : i + size]
+    )
+    return min(matched, len(text1), len(text2))
+
+
+def similarity(writeup1, writeup2, engine=DEFAULT_ENGINE):
+    """
+    Compute the unified diff and the match percentage of two writeups.
+
+    Args:
+        writeup1 (str): First writeup.
+        writeup2 (str): Second writeup.
+        engine (str): One of ENGINES.
+
+    Returns:
+        tuple: (diff, match_percentage)
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown similarity engine: {engine}")
+
+    lines1, lines2 = writeup1.splitlines(), writeup2.splitlines()
+    if engine == "legacy":
+        diff = "\n".join(unified_diff(lines1, lines2, lineterm=""))
+        return diff, SequenceMatcher(None, writeup1, writeup2).ratio() * 100
+
+    line_matcher = SequenceMatcher(None, lines1, lines2)
+    opcodes = line_matcher.get_opcodes()
+    matched = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            matched += sum(len(line) + 1 for line in lines1[i1:i2])
+        elif tag == "replace" and engine != "line":
+            block1 = "".join(line + "\n" for line in lines1[i1:i2])
+            block2 = "".join(line + "\n" for line in lines2[j1:j2])
+            if engine == "token":
+                matched += _token_matches(block1, block2)
+            else:
+                matched += lcs_length(block1, block2)
+
+    total = sum(len(line) + 1 for line in lines1) + sum(len(line) + 1 for line in lines2)
+    match_percentage = min(200.0 * matched / total, 100.0) if total else 100.0
+    diff = _unified_diff_from_opcodes(
+        lines1, lines2, line_matcher.get_grouped_opcodes(DIFF_CONTEXT)
+    )
+    return diff, match_percentage
+
+
+def compare_writeups(
+    writeup1,
+    writeup2,
+    threshold=MATCH_THRESHOLD,
+    margin=AMBIGUITY_MARGIN,
+    tiers=TIERS,
+    counts=None,
+    engine=DEFAULT_ENGINE,
+):
+    """
+    Compare two writeups through the tiered cascade.
+
+    Args:
+        writeup1 (str): First writeup.
+        writeup2 (str): Second writeup.
+        threshold (float): Match percentage at or above which is_match is True.
+        margin (float): Pairs whose match percentage is within this many points
+            of the threshold are escalated to the models.
+        tiers (tuple): Enabled tiers; the ratio tier always runs when reached.
+        counts (Counter): Optional counter incremented with the deciding tier.
+        engine (str): Similarity engine used for the full ratio, one of ENGINES.
+
+    Returns:
+        dict: diff, match_percentage, is_match, scibert_score, tfidf_score and
+        the tier that decided the result. Scores not computed are None.
+    """
+    result = {
+        "diff": "",
+        "match_percentage": None,
+        "is_match": False,
+        "scibert_score": None,
+        "tfidf_score": None,
+        "tier": None,
+    }
+
+    if "hash" in tiers and text_hash(writeup1) == text_hash(writeup2):
+        result.update(
+            match_percentage=100.0,
+            is_match=True,
+            tier="hash",
+        )
+    elif "normalized" in tiers and normalize_text(writeup1) == normalize_text(
+        writeup2
+    ):
+        result.update(
+            match_percentage=100.0,
+            is_match=True,
+            tier="normalized",
+        )
+
+    if result["tier"] is None:
+        bound = None
+        if "bound" in tiers and engine == "legacy":
+            matcher = SequenceMatcher(None, writeup1, writeup2)
+            bound = matcher.real_quick_ratio() * 100
+            if bound >= threshold - margin:
+                bound = matcher.quick_ratio() * 100
+
+        if bound is not None and bound < threshold - margin:
+            result.update(
+                diff="\n".join(
+                    unified_diff(writeup1.splitlines(), writeup2.splitlines(), lineterm="")
+                ),
+                match_percentage=bound,
+                tier="bound",
+            )
+        else:
+            diff, match_percentage = similarity(writeup1, writeup2, engine)
+            result.update(
+                diff=diff,
+                match_percentage=match_percentage,
+                is_match=match_percentage >= threshold,
+            )
+            if "model" in tiers and abs(match_percentage - threshold) <= margin:
+                # imported lazily so the SciBERT model is only loaded when needed
+                from ml_modules import scibert_compare, tfidf_compare
+
+                result.update(
+                    scibert_score=float(scibert_compare(writeup1, writeup2)),
+                    tfidf_score=float(tfidf_compare(writeup1, writeup2)),
+                    tier="model",
+                )
+            else:
+                result["tier"] = "ratio"
+
+    if counts is not None:
+        counts[result["tier"]] += 1
+    return result
+
+
+def format_tier_counts(counts):
+    """
+    Format per-tier counts as a single report line, in cascade order.
+    """
+    total = sum(counts.values())
+    return ", ".join(
+        f"{tier}: {counts.get(tier, 0)} ({counts.get(tier, 0) / total * 100 if total else 0:.1f}%)"
+        for tier in TIERS
+    ) + f" | total: {total}"
+
+
+def new_tier_counts():
+    """
+    Counter keyed by tier name.
+    """
+    return Counter({tier: 0 for tier in TIERS})
@@ -0,0 +1,218 @@
+"""
+Process pool executor for writeup comparisons.
+
+Each worker process pins torch to a fixed number of intra-op threads (so that
+workers * threads does not oversubscribe the CPU), loads the SciBERT model once
+in its initializer and then scores batches of writeup pairs through the
+comparison cascade in compare_modules.
+
+Autotune:
+    Benchmarks (workers, threads) configurations that fill the machine on a set
+    of writeup pairs (synthetic long writeups by default) and picks the fastest.
+
+Usage:
+    python compare_pool.py autotune
+    python compare_pool.py autotune -n 64 -c 1x8 2x4 4x2 8x1
+"""
+
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from compare_modules import compare_writeups, new_tier_counts
+
+
+DEFAULT_BATCH_SIZE = 8
+
+
+def _init_worker(threads):
+    """
+    Pin the thread pools of the worker before torch starts, then load the model.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    import ml_modules  # noqa: F401 loads the SciBERT model once per worker
+
+
+def _warm_up(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def compare_batch(pairs, cascade=None):
+    """
+    Compare a batch of writeup pairs in a worker.
+
+    Args:
+        pairs (list): (writeup1, writeup2) tuples.
+        cascade (dict): Keyword arguments for compare_writeups.
+
+    Returns:
+        tuple: (list of result dicts, Counter of deciding tiers)
+    """
+    counts = new_tier_counts()
+    results = [
+        compare_writeups(writeup1, writeup2, counts=counts, **(cascade or {}))
+        for writeup1, writeup2 in pairs
+    ]
+    return results, counts
+
+
+def default_config():
+    """
+    One single-threaded worker per core.
+    """
+    return os.cpu_count() or 1, 1
+
+
+def create_pool(workers=None, threads=None):
+    """
+    Create the comparison process pool and start all of its workers.
+
+    Args:
+        workers (int): Number of worker processes, defaults to one per core.
+        threads (int): torch threads per worker, defaults to cores // workers.
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    cpu_count = os.cpu_count() or 1
+    workers = workers or default_config()[0]
+    threads = threads or max(1, cpu_count // workers)
+    # spawn so workers never inherit a forked torch thread pool
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads,),
+    )
+    # occupy every worker at once so all of them are started and initialized
+    list(pool.map(_warm_up, [0.5] * workers))
+    return pool
+
+
+def compare_pairs(pool, pairs, cascade=None, batch_size=DEFAULT_BATCH_SIZE, counts=None):
+    """
+    Compare writeup pairs on the pool in batches, preserving input order.
+
+    Args:
+        pool (ProcessPoolExecutor): Pool from create_pool.
+        pairs (list): (writeup1, writeup2) tuples.
+        cascade (dict): Keyword arguments for compare_writeups.
+        batch_size (int): Pairs sent to a worker per task.
+        counts (Counter): Optional counter updated with the deciding tiers.
+
+    Returns:
+        list: Result dicts from compare_writeups.
+    """
+    futures = [
+        pool.submit(compare_batch, pairs[i : i + batch_size], cascade)
+        for i in range(0, len(pairs), batch_size)
+    ]
+    results = []
+    for future in futures:
+        batch_results, batch_counts = future.result()
+        results += batch_results
+        if counts is not None:
+            counts.update(batch_counts)
+    return results
+
+
+def candidate_configs():
+    """
+    (workers, threads) pairs using all cores, from one wide worker to one
+    single-threaded worker per core.
+    """
+    cpu_count = os.cpu_count() or 1
+    return [
+        (workers, cpu_count // workers)
+        for workers in range(1, cpu_count + 1)
+        if cpu_count % workers == 0
+    ]
+
+
+def sample_pairs(n_pairs=32, size=4000, seed=0):
+    """
+    Synthetic long writeup pairs with light edits, so that part of them are
+    escalated to the models like real ambiguous pairs.
+    """
+    import random
+    from bench_similarity import make_writeup, edit_writeup
+
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(n_pairs):
+        writeup = make_writeup(size, rng)
+        pairs.append((writeup, edit_writeup(writeup, 0.01 * (i % 4), rng)))
+    return pairs
+
+
+def autotune(pairs=None, configs=None, cascade=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Time each (workers, threads) configuration on the pairs and return the fastest.
+
+    Pool start-up and model loading are excluded from the timings.
+
+    Returns:
+        tuple: (workers, threads)
+    """
+    pairs = pairs or sample_pairs()
+    configs = configs or candidate_configs()
+    timings = {}
+    for workers, threads in configs:
+        pool = create_pool(workers, threads)
+        try:
+            start = time.perf_counter()
+            compare_pairs(pool, pairs, cascade, batch_size)
+            timings[(workers, threads)] = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        print(
+            f"workers={workers:<3} threads={threads:<3} "
+            f"{timings[(workers, threads)]:.2f}s "
+            f"({len(pairs) / timings[(workers, threads)]:.1f} pairs/s)"
+        )
+    best = min(timings, key=timings.get)
+    print(f"fastest: workers={best[0]} threads={best[1]}")
+    return best
+
+
+def parse_config(value):
+    """
+    argparse type for WORKERSxTHREADS, e.g. 4x2.
+    """
+    try:
+        workers, threads = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid configuration: {value}. Expected format: WORKERSxTHREADS"
+        )
+    return workers, threads
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark comparison pool configurations on this machine"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    tune_parser = subparsers.add_parser("autotune", help="Find the fastest configuration")
+    tune_parser.add_argument(
+        "-n", "--pairs", type=int, default=32, help="Number of synthetic pairs"
+    )
+    tune_parser.add_argument(
+        "-c",
+        "--configs",
+        nargs="+",
+        type=parse_config,
+        help="Configurations to try as WORKERSxTHREADS, defaults to all that fill the machine",
+    )
+    tune_parser.add_argument(
+        "-b", "--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help="Pairs per task"
+    )
+    args = parser.parse_args()
+    autotune(sample_pairs(args.pairs), args.configs, batch_size=args.batch_size)
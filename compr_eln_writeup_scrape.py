@@ -1,34 +1,53 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 import traceback
+import threading
 import psycopg2
+import psycopg2.pool
+import psycopg2.extras
 from os import getenv, path, getcwd, pardir
 import argparse
 from datetime import datetime
 from time import sleep
 from dotenv import load_dotenv
 import csv
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+from collections import Counter
 from contextlib import contextmanager
-from ml_modules import scibert_compare, tfidf_compare
-from difflib import unified_diff, SequenceMatcher
-from bs4 import BeautifulSoup
+from compare_modules import (
+    compare_writeups,
+    normalize_writeup,
+    format_tier_counts,
+    new_tier_counts,
+    MATCH_THRESHOLD,
+    AMBIGUITY_MARGIN,
+    ENGINES,
+    DEFAULT_ENGINE,
+)
+from driver_pool import DriverPool, DEFAULT_POOL_SIZE, DEFAULT_MAX_PAGES, PROFILES, DEFAULT_PROFILE
+from scrape_scheduler import run_pipeline
+from writeup_parser import parse_notebook, TABLE_LABELS
+from http_scraper import HttpFetcher, LOGIN_MODES, DEFAULT_LOGIN_MODE, DEFAULT_CONNECTIONS
 
 load_dotenv(override=True)
 dm_user = getenv("DM_USER")
 dm_pass = getenv("DM_PASS")
-date_formats = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"]
 timestamp = datetime.now().strftime("%Y-%m-%d")
 parent_dir = path.abspath(path.join(getcwd(), pardir))
 log_filename = path.join(parent_dir, f"writeup_scrape_{timestamp}.log")
 analysis_date = datetime.today()
+tier_counts = new_tier_counts()
+DB_POOL = None
+INSERT_BATCH_SIZE = 50
+# seconds a comparison waits for a batch to fill before flushing it itself
+FLUSH_WAIT = 5
+scraped_rows = {}
+# buffered or in-flight rows per exp_id, notified whenever a batch is committed
+pending_rows = Counter()
+scraped_rows_lock = threading.Lock()
+rows_committed = threading.Condition(scraped_rows_lock)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -37,19 +56,32 @@ logging.basicConfig(
 )
 
 
+def init_db_pool(maxconn):
+    """
+    Create the connection pool shared by the scrape workers and the comparisons.
+
+    Args:
+        maxconn (int): Maximum number of pooled connections.
+    """
+    global DB_POOL
+    DB_POOL = psycopg2.pool.ThreadedConnectionPool(1, maxconn, **DB_CONFIG)
+
+
 @contextmanager
 def get_db_connection():
-    """Context manager for database connection."""
+    """Context manager for a pooled database connection."""
     connection = None
     try:
-        connection = psycopg2.connect(**DB_CONFIG)
+        connection = DB_POOL.getconn()
         yield connection
     except Exception as e:
         logging.error(f"Database connection error: {e}")
+        if connection:
+            connection.rollback()
         raise
     finally:
         if connection:
-            connection.close()
+            DB_POOL.putconn(connection)
 
 
 def create_table():
@@ -69,8 +101,15 @@ def create_table():
                     solvents_table TEXT NOT NULL,
                     products_table TEXT NOT NULL,
                     write_up TEXT NOT NULL,
+                    normalized_text TEXT,
+                    reactants JSONB,
+                    solvents JSONB,
+                    products JSONB,
                     PRIMARY KEY(exp_id, system_name)
                 );
+                CREATE INDEX IF NOT EXISTS eln_writeup_scrapped_reactants_gin ON ELN_WRITEUP_SCRAPPED USING GIN (reactants jsonb_path_ops);
+                CREATE INDEX IF NOT EXISTS eln_writeup_scrapped_solvents_gin ON ELN_WRITEUP_SCRAPPED USING GIN (solvents jsonb_path_ops);
+                CREATE INDEX IF NOT EXISTS eln_writeup_scrapped_products_gin ON ELN_WRITEUP_SCRAPPED USING GIN (products jsonb_path_ops);
                 """
             )
             connection.commit()
@@ -80,83 +119,159 @@ def create_table():
         raise
 
 
-def save_to_database(exp_id, created_date, system_name, **kwargs):
+def save_to_database(exp_id, created_date, system_name, chemicals=None, **kwargs):
     """
-    Save writeup data to the PostgreSQL database.
+    Buffer a scraped writeup for the next batched insert. The writeup is
+    normalized here, once, into the normalized_text column.
 
     Args:
         exp_id (str): The experiment ID.
         created_date (date): The created date.
         system_name (str): The system name.
-        **kwargs: Additional tables and writeup data (reactant_table, solvent_table, writeup).
+        chemicals (dict): Parsed chemical tables by label, stored as JSONB.
+        **kwargs: Tables and writeup data (Reactants, Solvents, Products, write_up).
     """
-    try:
-        with get_db_connection() as connection:
-            cursor = connection.cursor()
+    chemicals = chemicals or {}
+    row = (
+        exp_id,
+        created_date,
+        system_name,
+        kwargs.get("Reactants"),
+        kwargs.get("Solvents"),
+        kwargs.get("Products"),
+        kwargs.get("write_up"),
+        normalize_writeup(kwargs.get("write_up")),
+        *(
+            # JSON null for missing tables, so the backfill skips the row
+            psycopg2.extras.Json(chemicals.get(label) or None)
+            for label in TABLE_LABELS
+        ),
+    )
+    with scraped_rows_lock:
+        # keyed so that a rescrape in the same batch does not upsert one row twice
+        if (exp_id, system_name) not in scraped_rows:
+            pending_rows[exp_id] += 1
+        scraped_rows[(exp_id, system_name)] = row
+        full = len(scraped_rows) >= INSERT_BATCH_SIZE
+    if full:
+        flush_rows()
 
-            # Prepare the columns and values for the INSERT query
-            table_columns = (
-                ", ".join(
-                    [
-                        f"{key.lower()}_table"
-                        for key in kwargs.keys()
-                        if not key.lower().startswith("write")
-                    ]
-                )
-                + ", write_up"
-            )
-            table_values_placeholders = ", ".join(["%s"] * len(kwargs))
-            table_values = list(kwargs.values())
-
-            # Build and execute the INSERT query
-            query = f"""
-                INSERT INTO ELN_WRITEUP_SCRAPPED (exp_id, created_date, system_name, {table_columns})
-                VALUES (%s, %s, %s, {table_values_placeholders});
-            """
-            cursor.execute(query, [exp_id, created_date, system_name] + table_values)
+
+def insert_rows(rows):
+    """
+    Upsert scraped writeups into ELN_WRITEUP_SCRAPPED in one statement; when
+    the batch fails, the rows are upserted one by one so that a bad row only
+    loses itself.
+
+    Args:
+        rows (list): Row tuples built by save_to_database.
+    """
+    query = """
+        INSERT INTO ELN_WRITEUP_SCRAPPED (exp_id, created_date, system_name, reactants_table, solvents_table, products_table, write_up, normalized_text, reactants, solvents, products)
+        VALUES %s
+        ON CONFLICT (exp_id, system_name) DO UPDATE SET
+            created_date = EXCLUDED.created_date,
+            reactants_table = EXCLUDED.reactants_table,
+            solvents_table = EXCLUDED.solvents_table,
+            products_table = EXCLUDED.products_table,
+            write_up = EXCLUDED.write_up,
+            normalized_text = EXCLUDED.normalized_text,
+            reactants = EXCLUDED.reactants,
+            solvents = EXCLUDED.solvents,
+            products = EXCLUDED.products;
+    """
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        try:
+            psycopg2.extras.execute_values(cursor, query, rows, page_size=INSERT_BATCH_SIZE)
             connection.commit()
-            logging.info(f"Data saved for exp_id {exp_id} in system {system_name}.")
+            logging.info(f"Data saved for {len(rows)} scraped writeups.")
+            return
+        except Exception as e:
+            connection.rollback()
+            logging.error(f"Error saving {len(rows)} scraped writeups, saving them one by one: {e}")
 
-    except Exception as e:
-        logging.error(f"Error saving to database: {e}")
-        raise
+        for row in rows:
+            try:
+                psycopg2.extras.execute_values(cursor, query, [row])
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                logging.error(f"Error saving exp_id {row[0]} on {row[2]}: {e}")
 
 
-def fetch_write_up(exp_id, system_name):
+def flush_rows():
     """
-    Fetch the write_up for a given exp_id and system_name from the database.
+    Upsert all buffered writeups and notify the comparisons waiting for them.
+    """
+    global scraped_rows
+    with scraped_rows_lock:
+        rows = scraped_rows
+        scraped_rows = {}
+    if not rows:
+        return
+
+    try:
+        insert_rows(list(rows.values()))
+    finally:
+        with rows_committed:
+            for exp_id, _ in rows:
+                pending_rows[exp_id] -= 1
+                if pending_rows[exp_id] <= 0:
+                    del pending_rows[exp_id]
+            rows_committed.notify_all()
+
+
+def wait_for_rows(exp_id):
+    """
+    Block until no row of exp_id is buffered or being inserted. The rows are
+    left to fill a batch for up to FLUSH_WAIT seconds before they are flushed
+    here, so comparisons do not defeat the batching.
 
     Args:
         exp_id (str): The experiment ID.
-        system_name (str): The system name.
+    """
+    with rows_committed:
+        if rows_committed.wait_for(lambda: not pending_rows[exp_id], timeout=FLUSH_WAIT):
+            return
+    flush_rows()
+    # rows taken by another thread's flush are still in flight
+    with rows_committed:
+        rows_committed.wait_for(lambda: not pending_rows[exp_id])
+
+
+def fetch_write_ups(exp_id, system_names):
+    """
+    Fetch the normalized write_ups of an exp_id for several systems in one query.
+
+    Args:
+        exp_id (str): The experiment ID.
+        system_names (list): The system names.
 
     Returns:
-        str: The write_up text.
+        dict: system_name to normalized write_up text, for the systems found.
     """
     try:
         with get_db_connection() as connection:
             cursor = connection.cursor()
             cursor.execute(
                 """
-                SELECT write_up
+                SELECT system_name, normalized_text, write_up
                 FROM ELN_WRITEUP_SCRAPPED
-                WHERE exp_id = %s AND system_name = %s;
+                WHERE exp_id = %s AND system_name = ANY(%s);
                 """,
-                (exp_id, system_name),
+                (exp_id, list(system_names)),
             )
-            result = cursor.fetchone()
-            if result:
-                soup = BeautifulSoup(result[0], "html.parser")
-                raw_text = soup.get_text(separator=" ")
-                return raw_text.strip()
-            else:
-                logging.warning(f"No write_up found for exp_id {exp_id} in system {system_name}.")
-                return ""
+            # rows saved before normalized_text existed until backfilled
+            return {
+                system_name: normalized_text if normalized_text is not None else normalize_writeup(write_up)
+                for system_name, normalized_text, write_up in cursor.fetchall()
+            }
     except Exception as e:
         logging.error(f"Error fetching write_up: {e}")
         raise
 
-def compare_and_save_results(exp_id, system_name_1, system_name_2, analysis_date):
+def compare_and_save_results(exp_id, system_name_1, system_name_2, analysis_date, cascade=None):
     """
     Compare write-ups from two systems and save the results to the comparison table.
 
@@ -165,237 +280,168 @@ def compare_and_save_results(exp_id, system_name_1, system_name_2, analysis_date
         system_name_1 (str): The first system name.
         system_name_2 (str): The second system name.
         analysis_date (date): The analysis date.
+        cascade (dict): Keyword arguments (threshold, margin, engine) for compare_writeups.
     """
     try:
-        writeup1 = fetch_write_up(exp_id, system_name_1)
-        writeup2 = fetch_write_up(exp_id, system_name_2)
+        # rows of this experiment may still be buffered or in flight
+        wait_for_rows(exp_id)
+        writeups = fetch_write_ups(exp_id, [system_name_1, system_name_2])
+        writeup1 = writeups.get(system_name_1)
+        writeup2 = writeups.get(system_name_2)
 
         if not writeup1 or not writeup2:
             logging.warning(f"Skipping comparison for exp_id {exp_id} due to missing write-ups.")
             return
 
-        diff = "\n".join(
-            unified_diff(writeup1.splitlines(), writeup2.splitlines(), lineterm="")
-        )
-        matcher = SequenceMatcher(None, writeup1, writeup2)
-        match_percentage = matcher.ratio() * 100
-        is_match = match_percentage >= 97
-
-        scibert_score = float(scibert_compare(writeup1, writeup2))
-        tfidf_score = float(tfidf_compare(writeup1, writeup2))
+        result = compare_writeups(writeup1, writeup2, counts=tier_counts, **(cascade or {}))
 
         with get_db_connection() as connection:
             cursor = connection.cursor()
             cursor.execute(
                 """
-                INSERT INTO ELN_WRITEUP_COMPARISON (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score, analysis_date)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO ELN_WRITEUP_COMPARISON (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score, analysis_date, compare_tier)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """,
-                (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score, analysis_date),
+                (
+                    exp_id,
+                    system_name_1,
+                    system_name_2,
+                    result["diff"],
+                    result["match_percentage"],
+                    result["is_match"],
+                    result["scibert_score"],
+                    result["tfidf_score"],
+                    analysis_date,
+                    result["tier"],
+                ),
             )
             connection.commit()
-            logging.info(f"Comparison results saved for exp_id {exp_id} between {system_name_1} and {system_name_2}.")
+            logging.info(f"Comparison results saved for exp_id {exp_id} between {system_name_1} and {system_name_2} (tier: {result['tier']}).")
     except Exception as e:
         logging.error(f"Error comparing and saving results: {e}")
         raise
 
 
-def scrape_writeup(exp_id, domain, index):
+def scrape_writeup(exp_id, domain, index, pool):
     """
     Scrape html text from DM website.
 
     Args:
         exp_id (str): The experiment ID.
         domain (str): The system name or domain.
+        pool (DriverPool): Pool of logged-in drivers for the domain.
     """
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
     global analysis_date
 
-    service = Service(ChromeDriverManager().install())
-    service.start_timeout = 30
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-
     try:
-        url = base_url_template.format(domain)
-        logging.info(f"Navigating to URL: {url}")
-        driver.get(url)
-
-        username_field = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(
-                (
-                    By.ID,
-                    "isid",
-                )
-            )
-        )
-
-        password_field = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(
-                (
-                    By.ID,
-                    "password",
-                )
-            )
-        )
-
-        login_button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(
-                (
-                    By.CSS_SELECTOR,
-                    "input[type='submit'][class='moduleButton']",
-                )
-            )
-        )
-
-        username_field.send_keys(dm_user)
-        password_field.send_keys(dm_pass)
-        login_button.click()
-
-        logging.info("Login successful!")
-
-        url = url + path_url_template.format(exp_id)
-        driver.get(url)
-
-        logging.info(f"Current URL: {driver.current_url}")
-
-        # exp_input_xpath = "//input[@id='mainSearch']"
-        # exp_input_xpath = "/html/body/header/div[3]/ul/li[3]/div[1]/input"
-        # exp_input = WebDriverWait(driver, 10).until(
-        #     EC.presence_of_element_located((By.XPATH, exp_input_xpath))
-        # )
-        # exp_input.clear()
-        # exp_input.send_keys(exp_id)
-        #
-        # search_results_xpath = "//div[@id='searchResults']"
-        # search_results = WebDriverWait(driver, 10).until(
-        #     EC.presence_of_element_located((By.XPATH, search_results_xpath))
-        # )
-        #
-        # exp_span_xpath = (
-        #     f"//div[@id='search_results_experiments']//span[@name='exp_{exp_id}']"
-        # )
-        # exp_span = WebDriverWait(driver, 10).until(
-        #     EC.element_to_be_clickable((By.XPATH, exp_span_xpath))
-        # )
-        #
-        # exp_span.click()
-
-        # exp_button_xpath = "/html/body/header/div[3]/ul/li[3]/div[2]/div[2]/div/div[2]/div/div/div[3]/div[1]/div[2]/a"
-        # exp_button = WebDriverWait(driver, 10).until(
-        #     EC.element_to_be_clickable((By.XPATH, exp_button_xpath))
-        # )
-        #
-        # exp_button.click()
-
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.ID, "samplenotebookiframe"))
-        )
-
-        iframe_1 = driver.find_element(By.ID, "samplenotebookiframe")
-
-        try:
-            driver.switch_to.frame(iframe_1)
-            logging.info("Switched to samplenotebook iframe")
-
-            textarea_div = WebDriverWait(driver, 12).until(
-                EC.presence_of_element_located(
-                    (By.XPATH, "//div[@data-customlabel='Textarea']")
-                )
-            )
-            # with open("tmp_studies_iframe.html", "w") as f:
-            #     f.write(driver.page_source)
-
-        except TimeoutException:
-            logging.error(
-                f"Timeout waiting for the content inside the iframe; exp id: {exp_id}."
+        with pool.driver() as driver:
+            url = pool.base_url + path_url_template.format(exp_id)
+            driver.get(url)
+
+            logging.info(f"Current URL: {driver.current_url}")
+
+            # exp_input_xpath = "//input[@id='mainSearch']"
+            # exp_input_xpath = "/html/body/header/div[3]/ul/li[3]/div[1]/input"
+            # exp_input = WebDriverWait(driver, 10).until(
+            #     EC.presence_of_element_located((By.XPATH, exp_input_xpath))
+            # )
+            # exp_input.clear()
+            # exp_input.send_keys(exp_id)
+            #
+            # search_results_xpath = "//div[@id='searchResults']"
+            # search_results = WebDriverWait(driver, 10).until(
+            #     EC.presence_of_element_located((By.XPATH, search_results_xpath))
+            # )
+            #
+            # exp_span_xpath = (
+            #     f"//div[@id='search_results_experiments']//span[@name='exp_{exp_id}']"
+            # )
+            # exp_span = WebDriverWait(driver, 10).until(
+            #     EC.element_to_be_clickable((By.XPATH, exp_span_xpath))
+            # )
+            #
+            # exp_span.click()
+
+            # exp_button_xpath = "/html/body/header/div[3]/ul/li[3]/div[2]/div[2]/div/div[2]/div/div/div[3]/div[1]/div[2]/a"
+            # exp_button = WebDriverWait(driver, 10).until(
+            #     EC.element_to_be_clickable((By.XPATH, exp_button_xpath))
+            # )
+            #
+            # exp_button.click()
+
+            WebDriverWait(driver, 20).until(
+                EC.presence_of_element_located((By.ID, "samplenotebookiframe"))
             )
-            textarea_div = None
 
-        # created date
-        date_div = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(
-                (By.XPATH, "//div[@data-customlabel='Date']")
-            )
-        )
+            iframe_1 = driver.find_element(By.ID, "samplenotebookiframe")
 
-        date_table = date_div.find_element(By.XPATH, "./table")
-        date_text = None
-        try:
-            date_tbody_span = date_table.find_element(By.XPATH, "./tbody//span")
-            date_text = date_tbody_span.text.strip()
-        except Exception:
-            pass
-
-        if not date_text:
-            try:
-                date_tbody_div = date_table.find_element(By.XPATH, "./tbody//div")
-                date_text = date_tbody_div.text.strip()
-            except Exception:
-                pass
-
-        logging.info(f"date: {date_text}")
-        date_value = None
-        for date_format in date_formats:
             try:
-                date_value = datetime.strptime(date_text, date_format)
-                break
-            except ValueError:
-                continue
+                driver.switch_to.frame(iframe_1)
+                logging.info("Switched to samplenotebook iframe")
 
-        # chemical tables
-        table_dct = {"Reactants": None, "Solvents": None, "Products": None}
-        try:
-            for label in table_dct.keys():
-                parent_span = driver.find_element(
-                    By.XPATH, f"//span[contains(text(), ' {label} ')]"
-                )
-                parent_div = parent_span.find_element(
-                    By.XPATH,
-                    "following-sibling::div[@data-customlabel='Table']",
-                )
-                table_dct[label] = parent_div.find_element(
-                    By.TAG_NAME, "table"
-                ).get_attribute("outerHTML")
-        except NoSuchElementException as e:
-            logging.error(f"Error extracting table element for {exp_id} - {label}: {e}")
-            table_dct[label] = None
-
-        # writeup textarea
-        try:
-            writeup_span = textarea_div.find_element(
-                By.XPATH, ".//span[contains(@class, 'formInputArea2')]"
-            )
-        except NoSuchElementException:
-            try:
-                writeup_span = textarea_div.find_element(
-                    By.XPATH, ".//*[@data-type='writeup']"
+                WebDriverWait(driver, 12).until(
+                    EC.presence_of_element_located(
+                        (By.XPATH, "//div[@data-customlabel='Textarea']")
+                    )
                 )
-            except NoSuchElementException as e:
-                write_up = None
-                logging.error(f"Error extracting writeup element {exp_id}: {e}")
-            else:
-                all_tags = writeup_span.find_elements(By.XPATH, ".//*")
-                write_up = " ".join(
-                    [tag.get_attribute("outerHTML") for tag in all_tags]
+            except TimeoutException:
+                logging.error(
+                    f"Timeout waiting for the content inside the iframe; exp id: {exp_id}."
                 )
-        else:
-            all_tags = writeup_span.find_elements(By.XPATH, ".//*")
-            write_up = " ".join([tag.get_attribute("outerHTML") for tag in all_tags])
 
-        logging.info(f"{index} [{exp_id}] {'=' * 42}")
-        save_to_database(exp_id, date_value, domain, **table_dct, write_up=write_up)
+            # one round trip for the whole iframe document, parsed offline
+            html = driver.page_source
+            driver.switch_to.default_content()
 
+        save_notebook(exp_id, domain, index, html)
+    except Exception as e:
+        logging.error("Comprehensive Error:")
+        logging.error(traceback.format_exc())
+        return None
+
+
+def scrape_writeup_http(exp_id, domain, index, fetcher):
+    """
+    Fetch the notebook iframe over plain HTTP, without a browser.
 
+    Args:
+        exp_id (str): The experiment ID.
+        domain (str): The system name or domain.
+        fetcher (HttpFetcher): Authenticated HTTP session for the domain.
+    """
+    try:
+        html = fetcher.notebook_html(path_url_template.format(exp_id))
+        save_notebook(exp_id, domain, index, html)
     except Exception as e:
         logging.error("Comprehensive Error:")
         logging.error(traceback.format_exc())
         return None
-    finally:
-        driver.quit()
+
+
+def save_notebook(exp_id, domain, index, html):
+    """
+    Parse the samplenotebook iframe html and save its writeup and tables.
+
+    Args:
+        exp_id (str): The experiment ID.
+        domain (str): The system name or domain.
+        html (str): samplenotebook iframe document.
+    """
+    notebook = parse_notebook(html, exp_id)
+    logging.info(f"date: {notebook['date_text']}")
+    if notebook["write_up"] is None:
+        logging.error(f"No writeup extracted for {exp_id} on {domain}; not saved.")
+        return
+
+    logging.info(f"{index} [{exp_id}] {'=' * 42}")
+    save_to_database(
+        exp_id,
+        notebook["created_date"],
+        domain,
+        chemicals=notebook["chemicals"],
+        **notebook["tables"],
+        write_up=notebook["write_up"],
+    )
 
 
 DB_CONFIG = {
@@ -436,7 +482,76 @@ def main():
         "--exp-id",
         help=f"Specify relatively short string of experiment ids comma delimited",
     )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        default=MATCH_THRESHOLD,
+        type=float,
+        help=f"Match percentage threshold for is_match, defaults to {MATCH_THRESHOLD}",
+    )
+    parser.add_argument(
+        "--margin",
+        default=AMBIGUITY_MARGIN,
+        type=float,
+        help=f"Margin around the threshold within which pairs are escalated to SciBERT and TF-IDF, defaults to {AMBIGUITY_MARGIN}",
+    )
+    parser.add_argument(
+        "--engine",
+        default=DEFAULT_ENGINE,
+        choices=ENGINES,
+        help=f"Similarity engine for the match percentage, defaults to {DEFAULT_ENGINE}",
+    )
+    parser.add_argument(
+        "-p",
+        "--pool-size",
+        default=DEFAULT_POOL_SIZE,
+        type=int,
+        help=f"Number of logged-in browser sessions kept per domain, defaults to {DEFAULT_POOL_SIZE}",
+    )
+    parser.add_argument(
+        "--max-pages",
+        default=DEFAULT_MAX_PAGES,
+        type=int,
+        help=f"Pages a browser session serves before it is recycled, defaults to {DEFAULT_MAX_PAGES}",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=base_url_template,
+        help=f"Browser base url template with {{0}} for the domain, e.g. http://127.0.0.1:8000/{{0}}/browser for fixture_replay.py, defaults to {base_url_template}",
+    )
+    parser.add_argument(
+        "--profile",
+        default=DEFAULT_PROFILE,
+        choices=PROFILES,
+        help=f"Chrome profile of the browser sessions; fast uses eager loads and blocks images, fonts and media, defaults to {DEFAULT_PROFILE}",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of concurrent scrape workers, defaults to pool size (or connections in http mode) times the number of domains",
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        default="browser",
+        choices=["browser", "http"],
+        help="Fetch pages with headless Chrome, or over plain HTTP with a session logged in once per domain, defaults to browser",
+    )
+    parser.add_argument(
+        "--login",
+        default=DEFAULT_LOGIN_MODE,
+        choices=LOGIN_MODES,
+        help=f"How the http mode session logs in: Selenium cookie export or form POST, defaults to {DEFAULT_LOGIN_MODE}",
+    )
+    parser.add_argument(
+        "--connections",
+        default=DEFAULT_CONNECTIONS,
+        type=int,
+        help=f"HTTP connections per domain in http mode, defaults to {DEFAULT_CONNECTIONS}",
+    )
     args = parser.parse_args()
+    cascade = {"threshold": args.threshold, "margin": args.margin, "engine": args.engine}
     if any(value == "" or value is None for value in DB_CONFIG.values()):
         raise ValueError(
             "One or more required configurations in DB_CONFIG are missing or empty."
@@ -445,12 +560,16 @@ def main():
     if not dm_user or not dm_pass:
         raise ValueError("DM user and/or pass not set")
 
-    if args.create:
-        create_table()
-
     base_path = path.join(getcwd(), "exp_ids")
     exp_ids = []
     clone_domains = [DOMAINS["clone1"], DOMAINS["clone2"]]
+    sessions_per_domain = args.connections if args.mode == "http" else args.pool_size
+    workers = args.workers or sessions_per_domain * len(clone_domains)
+
+    # one connection per scrape worker plus one for the comparisons
+    init_db_pool(workers + 1)
+    if args.create:
+        create_table()
 
     if args.exp_id:
         arg_exp_ids = args.exp_id.strip()
@@ -462,18 +581,48 @@ def main():
             for row in reader:
                 exp_ids.append(row[0])
 
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        for i, exp_id in enumerate(exp_ids, start=1):
-            futures = [executor.submit(scrape_writeup, exp_id, domain, i) for domain in clone_domains]
-
-            for future in as_completed(futures):
-               try:
-                   future.result()  # Ensure the task completed successfully
-               except Exception as e:
-                   logging.error(f"Error during scraping: {e}")
+    if args.mode == "http":
+        sessions = {
+            domain: HttpFetcher(
+                args.base_url.format(domain),
+                dm_user,
+                dm_pass,
+                login_mode=args.login,
+                connections=args.connections,
+            )
+            for domain in clone_domains
+        }
+        scrape = lambda exp_id, domain, i: scrape_writeup_http(exp_id, domain, i, sessions[domain])
+    else:
+        sessions = {
+            domain: DriverPool(
+                args.base_url.format(domain),
+                dm_user,
+                dm_pass,
+                size=args.pool_size,
+                max_pages=args.max_pages,
+                profile=args.profile,
+            )
+            for domain in clone_domains
+        }
+        scrape = lambda exp_id, domain, i: scrape_writeup(exp_id, domain, i, sessions[domain])
 
+    try:
+        run_pipeline(
+            exp_ids,
+            clone_domains,
+            scrape,
             # compare prelude-masks2 vs prelude-masks
-            compare_and_save_results(exp_id, clone_domains[1], clone_domains[0], analysis_date)
+            lambda exp_id: compare_and_save_results(exp_id, clone_domains[1], clone_domains[0], analysis_date, cascade),
+            workers,
+        )
+    finally:
+        for session in sessions.values():
+            session.close()
+        flush_rows()
+        DB_POOL.closeall()
+
+    logging.info(f"Comparison tiers: {format_tier_counts(tier_counts)}")
 
 if __name__ == "__main__":
     main()
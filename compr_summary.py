@@ -0,0 +1,192 @@
+"""
+Incrementally maintained summary of ELN_WRITEUP_COMPARISON results.
+
+ELN_WRITEUP_COMPARISON_SUMMARY holds one row per (exp_id, system pair,
+analysis_date) with the comparison metrics and a short preview of the first
+writeup, without the diff or writeup bodies. A row trigger on
+ELN_WRITEUP_COMPARISON keeps it in step with every insert, upsert and delete,
+so reports read it by date and exp_id through its indexes instead of grouping
+over full writeups. refresh resynchronizes it from the comparison table, for
+the initial load or after bulk changes with the trigger disabled.
+
+Usage:
+    python compr_summary.py create
+    python compr_summary.py refresh -d 2025-03-01
+"""
+
+import argparse
+import psycopg2
+from os import getenv
+from datetime import datetime
+from dotenv import load_dotenv
+
+
+load_dotenv(override=True)
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+PREVIEW_LENGTH = 100
+SUMMARY_DDL = f"""
+CREATE TABLE IF NOT EXISTS ELN_WRITEUP_COMPARISON_SUMMARY (
+    exp_id VARCHAR NOT NULL,
+    system_name_1 VARCHAR NOT NULL,
+    system_name_2 VARCHAR NOT NULL,
+    analysis_date DATE NOT NULL,
+    match_percentage NUMERIC,
+    is_match BOOLEAN,
+    scibert_score NUMERIC,
+    tfidf_score NUMERIC,
+    compare_tier VARCHAR(20),
+    write_up_preview VARCHAR({PREVIEW_LENGTH}),
+    refreshed_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (exp_id, system_name_1, system_name_2, analysis_date)
+);
+CREATE INDEX IF NOT EXISTS eln_writeup_compr_summary_date_idx
+    ON ELN_WRITEUP_COMPARISON_SUMMARY (analysis_date, exp_id);
+CREATE INDEX IF NOT EXISTS eln_writeup_compr_summary_pair_idx
+    ON ELN_WRITEUP_COMPARISON_SUMMARY (system_name_1, system_name_2, analysis_date);
+
+CREATE OR REPLACE FUNCTION eln_writeup_compr_summary_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (
+        TG_OP = 'UPDATE'
+        AND (OLD.exp_id, OLD.system_name_1, OLD.system_name_2, OLD.analysis_date)
+            IS DISTINCT FROM (NEW.exp_id, NEW.system_name_1, NEW.system_name_2, NEW.analysis_date)
+    ) THEN
+        DELETE FROM ELN_WRITEUP_COMPARISON_SUMMARY
+        WHERE exp_id = OLD.exp_id
+            AND system_name_1 = OLD.system_name_1
+            AND system_name_2 = OLD.system_name_2
+            AND analysis_date = OLD.analysis_date;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+
+    INSERT INTO ELN_WRITEUP_COMPARISON_SUMMARY
+        (exp_id, system_name_1, system_name_2, analysis_date, match_percentage, is_match,
+         scibert_score, tfidf_score, compare_tier, write_up_preview, refreshed_at)
+    VALUES (
+        NEW.exp_id, NEW.system_name_1, NEW.system_name_2, NEW.analysis_date,
+        NEW.match_percentage, NEW.is_match, NEW.scibert_score, NEW.tfidf_score, NEW.compare_tier,
+        (SELECT LEFT(COALESCE(e.normalized_text, e.write_up), {PREVIEW_LENGTH})
+         FROM ELN_WRITEUP_API_EXTRACT e
+         WHERE e.exp_id = NEW.exp_id
+             AND e.system_name = NEW.system_name_1
+             AND e.analysis_date = NEW.analysis_date),
+        now()
+    )
+    ON CONFLICT (exp_id, system_name_1, system_name_2, analysis_date) DO UPDATE SET
+        match_percentage = EXCLUDED.match_percentage,
+        is_match = EXCLUDED.is_match,
+        scibert_score = EXCLUDED.scibert_score,
+        tfidf_score = EXCLUDED.tfidf_score,
+        compare_tier = EXCLUDED.compare_tier,
+        write_up_preview = EXCLUDED.write_up_preview,
+        refreshed_at = EXCLUDED.refreshed_at;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS eln_writeup_compr_summary_trg ON ELN_WRITEUP_COMPARISON;
+CREATE TRIGGER eln_writeup_compr_summary_trg
+    AFTER INSERT OR UPDATE OR DELETE ON ELN_WRITEUP_COMPARISON
+    FOR EACH ROW EXECUTE FUNCTION eln_writeup_compr_summary_sync();
+"""
+REFRESH_QUERY = f"""
+INSERT INTO ELN_WRITEUP_COMPARISON_SUMMARY
+    (exp_id, system_name_1, system_name_2, analysis_date, match_percentage, is_match,
+     scibert_score, tfidf_score, compare_tier, write_up_preview, refreshed_at)
+SELECT c.exp_id, c.system_name_1, c.system_name_2, c.analysis_date, c.match_percentage,
+       c.is_match, c.scibert_score, c.tfidf_score, c.compare_tier,
+       LEFT(COALESCE(e.normalized_text, e.write_up), {PREVIEW_LENGTH}), now()
+FROM ELN_WRITEUP_COMPARISON c
+LEFT JOIN ELN_WRITEUP_API_EXTRACT e
+    ON e.exp_id = c.exp_id
+    AND e.system_name = c.system_name_1
+    AND e.analysis_date = c.analysis_date
+WHERE c.analysis_date >= %(since)s
+ON CONFLICT (exp_id, system_name_1, system_name_2, analysis_date) DO UPDATE SET
+    match_percentage = EXCLUDED.match_percentage,
+    is_match = EXCLUDED.is_match,
+    scibert_score = EXCLUDED.scibert_score,
+    tfidf_score = EXCLUDED.tfidf_score,
+    compare_tier = EXCLUDED.compare_tier,
+    write_up_preview = EXCLUDED.write_up_preview,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+PRUNE_QUERY = """
+DELETE FROM ELN_WRITEUP_COMPARISON_SUMMARY s
+WHERE s.analysis_date >= %(since)s
+    AND NOT EXISTS (
+        SELECT 1 FROM ELN_WRITEUP_COMPARISON c
+        WHERE c.exp_id = s.exp_id
+            AND c.system_name_1 = s.system_name_1
+            AND c.system_name_2 = s.system_name_2
+            AND c.analysis_date = s.analysis_date
+    )
+"""
+
+
+def create_summary(cursor):
+    """
+    Create the summary table, its indexes and the sync trigger.
+    """
+    cursor.execute(SUMMARY_DDL)
+
+
+def refresh_summary(cursor, since=None):
+    """
+    Resynchronize the summary with the comparisons from the since date on.
+
+    Args:
+        cursor (cursor): Database cursor.
+        since (date): First analysis date refreshed, defaults to all dates.
+
+    Returns:
+        tuple: (rows upserted, rows pruned)
+    """
+    params = {"since": since or datetime.min.date()}
+    cursor.execute(REFRESH_QUERY, params)
+    upserted = cursor.rowcount
+    cursor.execute(PRUNE_QUERY, params)
+    return upserted, cursor.rowcount
+
+
+def valid_date(date_str):
+    """
+    Validate that the date string is in the format YYYY-MM-DD.
+    """
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid date format: {date_str}. Expected format: YYYY-MM-DD"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create or refresh the ELN writeup comparison summary"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("create", help="Create the summary table and sync trigger, then load it")
+    refresh_parser = subparsers.add_parser("refresh", help="Resynchronize the summary")
+    refresh_parser.add_argument(
+        "-d", "--since", type=valid_date, help="First analysis date to refresh, YYYY-MM-DD"
+    )
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(**DB_CONFIG)
+    cursor = connection.cursor()
+    if args.command == "create":
+        create_summary(cursor)
+    upserted, pruned = refresh_summary(cursor, getattr(args, "since", None))
+    connection.commit()
+    cursor.close()
+    connection.close()
+    print(f"Summary refreshed: {upserted} rows upserted, {pruned} rows pruned")
@@ -0,0 +1,284 @@
+"""
+Pool of long-lived, logged-in headless Chrome sessions for the writeup scraper.
+
+Each domain gets its own pool. Drivers are started and logged in lazily up to
+the pool size, checked out for one page and returned. A driver is health
+checked (responsive and not on the login form) on checkout and is recycled
+(quit and replaced by a fresh login) after max_pages pages, or when a WebDriver
+error happens while it is checked out and the session is dead or logged out.
+
+Chrome profiles:
+    default: Plain headless Chrome, full page loads.
+    fast: Eager page loads (DOMContentLoaded), images/fonts/media blocked via
+        CDP URL patterns, extensions/sync/background networking disabled and a
+        user-data dir reused per pool slot, so the disk cache survives recycling.
+"""
+
+import logging
+import tempfile
+import threading
+from os import path
+from collections import deque
+from functools import lru_cache
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import (
+    WebDriverException,
+    InvalidSessionIdException,
+    NoSuchWindowException,
+)
+from webdriver_manager.chrome import ChromeDriverManager
+
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_PAGES = 50
+PROFILES = ("default", "fast")
+DEFAULT_PROFILE = "default"
+# errors after which the browser session itself is gone
+SESSION_ERRORS = (InvalidSessionIdException, NoSuchWindowException)
+PROFILE_DIR = path.join(tempfile.gettempdir(), "eln_writeup_chrome")
+FAST_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-sync",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--no-first-run",
+    "--mute-audio",
+]
+BLOCKED_URL_PATTERNS = [
+    f"*.{extension}"
+    for extension in (
+        "png", "jpg", "jpeg", "gif", "svg", "ico", "webp", "bmp",
+        "woff", "woff2", "ttf", "otf", "eot",
+        "mp3", "mp4", "webm", "ogg", "wav",
+    )
+]
+
+
+@lru_cache(maxsize=None)
+def chromedriver_path():
+    """
+    Resolve (and download if needed) chromedriver once per process.
+    """
+    return ChromeDriverManager().install()
+
+
+def chrome_options(profile=DEFAULT_PROFILE, user_data_dir=None):
+    """
+    Chrome options for the profile.
+
+    Args:
+        profile (str): default or fast.
+        user_data_dir (str): Reused user-data dir for the fast profile.
+    """
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    if profile == "fast":
+        chrome_options.page_load_strategy = "eager"
+        for argument in FAST_ARGUMENTS:
+            chrome_options.add_argument(argument)
+        if user_data_dir:
+            chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
+    return chrome_options
+
+
+def create_driver(profile=DEFAULT_PROFILE, user_data_dir=None):
+    service = Service(chromedriver_path())
+    service.start_timeout = 30
+    driver = webdriver.Chrome(
+        service=service, options=chrome_options(profile, user_data_dir)
+    )
+    if profile == "fast":
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    return driver
+
+
+def profile_dir(base_url, slot):
+    """
+    User-data dir of a pool slot; Chrome locks a profile, so each live driver
+    needs its own.
+    """
+    host = base_url.split("//")[-1].split("/")[0]
+    return path.join(PROFILE_DIR, f"{host}-{slot}")
+
+
+def login(driver, base_url, user, password):
+    """
+    Log in through the Dotmatics browser login form.
+
+    Args:
+        driver (WebDriver): Chrome driver.
+        base_url (str): Browser base url of the domain.
+        user (str): DM user.
+        password (str): DM password.
+    """
+    logging.info(f"Navigating to URL: {base_url}")
+    driver.get(base_url)
+
+    username_field = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "isid"))
+    )
+    password_field = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "password"))
+    )
+    login_button = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located(
+            (By.CSS_SELECTOR, "input[type='submit'][class='moduleButton']")
+        )
+    )
+
+    username_field.send_keys(user)
+    password_field.send_keys(password)
+    login_button.click()
+
+    logging.info("Login successful!")
+
+
+class DriverPool:
+    """
+    Thread-safe pool of logged-in drivers for one domain.
+
+    Args:
+        base_url (str): Browser base url of the domain.
+        user (str): DM user.
+        password (str): DM password.
+        size (int): Maximum number of live drivers.
+        max_pages (int): Pages served by a driver before it is recycled.
+        profile (str): Chrome profile, default or fast.
+    """
+
+    def __init__(self, base_url, user, password, size=DEFAULT_POOL_SIZE, max_pages=DEFAULT_MAX_PAGES, profile=DEFAULT_PROFILE):
+        self.base_url = base_url
+        self.user = user
+        self.password = password
+        self.size = size
+        self.max_pages = max_pages
+        self.profile = profile
+        self.idle = deque()
+        self.pages = {}
+        self.slots = {}
+        self.free_slots = list(range(size))
+        self.live = 0
+        self.lock = threading.Lock()
+        # notified when a driver is returned or a live slot frees up
+        self.available = threading.Condition(self.lock)
+
+    def _start(self):
+        with self.lock:
+            slot = self.free_slots.pop()
+        try:
+            driver = create_driver(self.profile, profile_dir(self.base_url, slot))
+        except Exception:
+            with self.lock:
+                self.free_slots.append(slot)
+            raise
+        self.slots[id(driver)] = slot
+        try:
+            login(driver, self.base_url, self.user, self.password)
+        except Exception:
+            self._quit(driver)
+            raise
+        self.pages[id(driver)] = 0
+        return driver
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Error quitting driver: {e}")
+        with self.lock:
+            self.free_slots.append(self.slots.pop(id(driver)))
+
+    def _discard(self, driver):
+        self.pages.pop(id(driver), None)
+        self._quit(driver)
+        with self.available:
+            self.live -= 1
+            self.available.notify()
+
+    def _healthy(self, driver):
+        """
+        Whether the driver responds and is still logged in, i.e. its last page
+        is not the login form.
+        """
+        try:
+            driver.switch_to.default_content()
+            return driver.execute_script(
+                "return document.getElementById('isid') === null"
+            ) is True
+        except WebDriverException:
+            return False
+
+    def _checkout(self):
+        while True:
+            with self.available:
+                self.available.wait_for(lambda: self.idle or self.live < self.size)
+                driver = self.idle.popleft() if self.idle else None
+                if driver is None:
+                    self.live += 1
+            if driver is None:
+                try:
+                    return self._start()
+                except Exception:
+                    with self.available:
+                        self.live -= 1
+                        self.available.notify()
+                    raise
+            if self._healthy(driver):
+                return driver
+            logging.warning(f"Recycling unresponsive or logged out driver for {self.base_url}")
+            self._discard(driver)
+
+    @contextmanager
+    def driver(self):
+        """
+        Check out a logged-in driver; it is returned to the pool afterwards, or
+        recycled after max_pages pages or a WebDriver error that left the
+        session dead or logged out (a page timeout alone keeps the driver).
+        """
+        driver = self._checkout()
+        try:
+            yield driver
+        except WebDriverException as e:
+            if isinstance(e, SESSION_ERRORS) or not self._healthy(driver):
+                logging.warning(f"Recycling driver for {self.base_url} after WebDriver error")
+                self._discard(driver)
+            else:
+                self._release(driver)
+            raise
+        except BaseException:
+            self._release(driver)
+            raise
+        else:
+            self._release(driver)
+
+    def _release(self, driver):
+        self.pages[id(driver)] += 1
+        if self.pages[id(driver)] >= self.max_pages:
+            logging.info(f"Recycling driver for {self.base_url} after {self.max_pages} pages")
+            self._discard(driver)
+        else:
+            with self.available:
+                self.idle.append(driver)
+                self.available.notify()
+
+    def close(self):
+        """
+        Quit all idle drivers.
+        """
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                driver = self.idle.popleft()
+            self._discard(driver)
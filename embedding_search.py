@@ -0,0 +1,247 @@
+"""
+Semantic nearest-neighbour search over SciBERT writeup embeddings.
+
+The CLS embeddings from ml_modules.get_embedding are persisted once per writeup
+as a compact matrix (L2 normalized, float16 by default) in an .npz file, with
+the (exp_id, system_name, analysis_date) keys and the trained IVF quantizer
+alongside. The matrix is upcast to float32 in memory so the scans use BLAS.
+Queries are answered by cosine similarity against the matrix:
+
+    exact: Dot product against every row and argpartition for the top k.
+    ivf: Coarse quantizer of NLIST k-means centroids; only the NPROBE closest
+        inverted lists are scanned, for corpora where the exact scan is too slow.
+
+Usage:
+    python embedding_search.py build -o writeup_embeddings.npz
+    python embedding_search.py query -e 123456 -k 10
+    python embedding_search.py query -q "Suzuki coupling with Pd catalyst" -m ivf
+"""
+
+import argparse
+import psycopg2
+import numpy as np
+from os import getenv
+from collections import defaultdict
+from dotenv import load_dotenv
+
+
+load_dotenv(override=True)
+DEFAULT_PATH = "writeup_embeddings.npz"
+NLIST = 256
+EMBED_BATCH_SIZE = 16
+NPROBE = 8
+KMEANS_ITERATIONS = 20
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def embed_texts(texts):
+    """
+    L2 normalized SciBERT CLS embeddings of the texts, one row per text.
+    """
+    from ml_modules import get_embedding
+
+    texts = list(texts)
+    return normalize_rows(
+        np.vstack(
+            [
+                get_embedding(texts[i : i + EMBED_BATCH_SIZE]).numpy()
+                for i in range(0, len(texts), EMBED_BATCH_SIZE)
+            ]
+        ).astype(np.float32)
+    )
+
+
+def build_embeddings(path=DEFAULT_PATH, dtype="float16", batch_size=200):
+    """
+    Embed every stored writeup and save the matrix and keys to an .npz file.
+
+    Args:
+        path (str): Output .npz path.
+        dtype (str): float16 or float32 storage.
+        batch_size (int): Rows fetched per round trip.
+    """
+    connection = psycopg2.connect(**DB_CONFIG)
+    cursor = connection.cursor(name="embedding_build")
+    cursor.itersize = batch_size
+    cursor.execute(
+        """
+        SELECT exp_id, system_name, analysis_date, COALESCE(normalized_text, write_up)
+        FROM ELN_WRITEUP_API_EXTRACT
+        ORDER BY exp_id, system_name, analysis_date
+        """
+    )
+    keys, blocks = [], []
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        keys += [(exp_id, system_name, str(analysis_date)) for exp_id, system_name, analysis_date, _ in batch]
+        blocks.append(embed_texts([row[3] for row in batch]).astype(dtype))
+        print(f"{len(keys)} writeups embedded...")
+    cursor.close()
+    connection.close()
+
+    embeddings = np.vstack(blocks) if blocks else np.empty((0, 768), dtype=dtype)
+    index = EmbeddingIndex(embeddings, keys)
+    if len(keys):
+        index.train_ivf()
+    index.save(path, dtype)
+    print(f"{len(keys)} embeddings saved to {path}")
+
+
+class EmbeddingIndex:
+    """
+    Exact and IVF cosine search over a persisted embedding matrix.
+    """
+
+    def __init__(self, embeddings, keys):
+        self.embeddings = embeddings.astype(np.float32)
+        self.keys = [tuple(str(part) for part in key) for key in keys]
+        self.rows_by_exp_id = defaultdict(list)
+        for row, key in enumerate(self.keys):
+            self.rows_by_exp_id[key[0]].append(row)
+        self.centroids = None
+        self.lists = None
+        self.assignment = None
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        data = np.load(path)
+        index = cls(data["embeddings"], data["keys"])
+        if "centroids" in data:
+            index.centroids = data["centroids"].astype(np.float32)
+            index._build_lists(data["assignment"])
+        return index
+
+    def save(self, path=DEFAULT_PATH, dtype="float16"):
+        arrays = {
+            "embeddings": self.embeddings.astype(dtype),
+            "keys": np.array(self.keys, dtype=str).reshape(-1, 3),
+        }
+        if self.centroids is not None:
+            arrays["centroids"] = self.centroids
+            arrays["assignment"] = self.assignment
+        np.savez(path, **arrays)
+
+    def _build_lists(self, assignment):
+        self.assignment = assignment
+        self.lists = [
+            np.flatnonzero(assignment == i) for i in range(len(self.centroids))
+        ]
+
+    def rows_for(self, exp_id):
+        return self.rows_by_exp_id.get(str(exp_id), [])
+
+    def _top_k(self, scores, rows, k):
+        k = min(k, len(rows))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.keys[rows[i]], float(scores[i])) for i in top]
+
+    def search(self, query, k=10, exclude=()):
+        """
+        Exact top-k by cosine similarity.
+
+        Args:
+            query (np.ndarray): L2 normalized query vector.
+            k (int): Number of results.
+            exclude (iterable): Row indices left out of the results.
+
+        Returns:
+            list: (key, score) tuples, most similar first.
+        """
+        scores = self.embeddings @ query.astype(np.float32)
+        keep = np.ones(len(scores), dtype=bool)
+        keep[list(exclude)] = False
+        rows = np.flatnonzero(keep)
+        return self._top_k(scores[rows], rows, k)
+
+    def train_ivf(self, nlist=NLIST, iterations=KMEANS_ITERATIONS, seed=0):
+        """
+        Train the coarse quantizer with spherical k-means and build the inverted lists.
+        """
+        data = self.embeddings
+        nlist = min(nlist, len(data))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(len(data), nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            counts = np.bincount(assignment, minlength=nlist)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            filled = counts > 0
+            sums = centroids.copy()
+            sums[filled] = np.add.reduceat(data[order], starts[filled], axis=0)
+            centroids = normalize_rows(sums)
+        self.centroids = centroids
+        self._build_lists(np.argmax(data @ centroids.T, axis=1))
+
+    def search_ivf(self, query, k=10, nprobe=NPROBE, exclude=()):
+        """
+        Approximate top-k scanning only the nprobe closest inverted lists.
+        """
+        if self.centroids is None:
+            self.train_ivf()
+        probes = np.argsort(-(self.centroids @ query))[:nprobe]
+        rows = np.concatenate([self.lists[i] for i in probes])
+        rows = rows[~np.isin(rows, list(exclude))]
+        scores = self.embeddings[rows] @ query.astype(np.float32)
+        return self._top_k(scores, rows, k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Semantic nearest-neighbour search over SciBERT writeup embeddings"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Embed and persist all writeups")
+    build_parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="Output .npz file")
+    build_parser.add_argument(
+        "--dtype", choices=["float16", "float32"], default="float16", help="Storage dtype"
+    )
+    query_parser = subparsers.add_parser("query", help="Top-k most similar writeups")
+    target = query_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-e", "--exp_id", help="Experiment ID to search from")
+    target.add_argument("-q", "--query", help="Free text to search for")
+    query_parser.add_argument("-i", "--input", default=DEFAULT_PATH, help="Embeddings .npz file")
+    query_parser.add_argument("-k", type=int, default=10, help="Number of results")
+    query_parser.add_argument(
+        "-m", "--mode", choices=["exact", "ivf"], default="exact", help="Search mode"
+    )
+    query_parser.add_argument("--nprobe", type=int, default=NPROBE, help="IVF lists scanned")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_embeddings(args.output, args.dtype)
+    else:
+        index = EmbeddingIndex.load(args.input)
+        exclude = []
+        if args.exp_id:
+            exclude = index.rows_for(args.exp_id)
+            if not exclude:
+                raise SystemExit(f"No embedding stored for exp_id {args.exp_id}")
+            query = normalize_rows(
+                index.embeddings[exclude].astype(np.float32).mean(axis=0, keepdims=True)
+            )[0]
+        else:
+            query = embed_texts([args.query])[0]
+        if args.mode == "ivf":
+            results = index.search_ivf(query, args.k, args.nprobe, exclude)
+        else:
+            results = index.search(query, args.k, exclude)
+        for (exp_id, system_name, analysis_date), score in results:
+            print(f"{exp_id:<8} {system_name:<24} {analysis_date} {score:.4f}")
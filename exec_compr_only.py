@@ -1,10 +1,31 @@
+"""
+Backfill missing comparisons between two systems of ELN_WRITEUP_API_EXTRACT.
+
+The experiments of system_name_1 extracted on the analysis date that have no
+comparison against system_name_2 yet are found with one anti-join, and both of
+their writeups are streamed in chunks through a server-side cursor. Each chunk
+is compared on a pool of worker processes (compare_pool), upserted in one
+statement and committed on its own, so a failed or interrupted run only loses
+the chunk in flight; running it again resumes with the comparisons that are
+still missing.
+
+Usage:
+    python exec_compr_only.py -s1 prelude-masks -s2 prelude-prod-sdpo-8251 -d 2025-03-01 -w 4
+"""
+
+import time
+import argparse
+import traceback
 import psycopg2
+import psycopg2.extras
 from os import getenv
 from dotenv import load_dotenv
-from difflib import unified_diff, SequenceMatcher
-from transformers import AutoTokenizer, AutoModel
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from compare_modules import (
+    normalize_writeup,
+    format_tier_counts,
+    new_tier_counts,
+)
+from compare_pool import create_pool, compare_pairs, compare_batch
 
 
 load_dotenv(override=True)
@@ -17,156 +38,214 @@ DB_CONFIG = {
     "host": getenv("DB_HOST"),
     "port": getenv("DB_PORT"),
 }
-MODEL_NAME = "allenai/scibert_scivocab_uncased"
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModel.from_pretrained(MODEL_NAME)
-query_missing_eid = """
-SELECT COALESCE(e1.exp_id, e2.exp_id) AS missing_exp_id
+match_threshold = 95
+# writeups of system_name_1 on the analysis date without a comparison against
+# system_name_2, with the writeup of system_name_2 from the same analysis date;
+# experiments system_name_2 has no writeup for yet are left for a later run;
+# write_up is only sent when normalized_text has not been backfilled
+query_missing_compr = """
+SELECT e1.exp_id,
+       e1.normalized_text,
+       CASE WHEN e1.normalized_text IS NULL THEN e1.write_up END,
+       e2.normalized_text,
+       CASE WHEN e2.normalized_text IS NULL THEN e2.write_up END
 FROM eln_writeup_api_extract e1
-FULL OUTER JOIN eln_writeup_comparison e2
-ON e1.exp_id = e2.exp_id
-WHERE e1.exp_id IS NULL OR e2.exp_id IS NULL
+JOIN eln_writeup_api_extract e2
+    ON e2.exp_id = e1.exp_id
+    AND e2.system_name = %(system_name_2)s
+    AND e2.analysis_date = e1.analysis_date
+WHERE e1.system_name = %(system_name_1)s
+    AND e1.analysis_date = %(analysis_date)s
+    AND NOT EXISTS (
+        SELECT 1 FROM eln_writeup_comparison c
+        WHERE c.exp_id = e1.exp_id
+            AND c.system_name_1 = %(system_name_1)s
+            AND c.system_name_2 = %(system_name_2)s
+            AND c.analysis_date = e1.analysis_date
+    )
+ORDER BY e1.exp_id
+"""
+query_latest_analysis_date = """
+SELECT MAX(analysis_date) FROM eln_writeup_api_extract WHERE system_name = %s
 """
-query_retrieve_writeup = "SELECT write_up from eln_writeup_api_extract where system_name = '{0}' and exp_id = '{1}'"
-
 
 
-def save_compr_to_db(
-    cursor,
-    exp_id,
-    system_name_1,
-    system_name_2,
-    diff,
-    match_percentage,
-    is_match,
-    scibert_score,
-    tfidf_score,
-):
+def save_compr_to_db(cursor, rows):
     """
-    Saves comparison data to the database with on conflict logic.
+    Upserts a chunk of comparisons into the database in one statement.
 
     Args:
-        exp_id (str): Experiment ID.
-        system_name_1 (str): First system name.
-        system_name_2 (str): Second system name.
-        diff (str): Diff content.
-        match_percentage (float): Match percentage.
-        is_match (bool): Whether the match percentage meets the threshold.
-        scibertt_score (float): scibert model cosine similarity score.
-        tfidf_score (float): tf-idf model cosine similarity score.
+        cursor (cursor): Database cursor.
+        rows (list): (exp_id, system_name_1, system_name_2, diff, match_percentage,
+            is_match, scibert_score, tfidf_score, analysis_date, compare_tier) tuples.
     """
-    cursor.execute(
+    psycopg2.extras.execute_values(
+        cursor,
         """
-        INSERT INTO ELN_WRITEUP_COMPARISON 
-        (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (exp_id, system_name_1, system_name_2) 
-        DO UPDATE SET 
+        INSERT INTO ELN_WRITEUP_COMPARISON
+        (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score, analysis_date, compare_tier)
+        VALUES %s
+        ON CONFLICT (exp_id, system_name_1, system_name_2, analysis_date)
+        DO UPDATE SET
         diff = EXCLUDED.diff,
         match_percentage = EXCLUDED.match_percentage,
         is_match = EXCLUDED.is_match,
         scibert_score = EXCLUDED.scibert_score,
-        tfidf_score = EXCLUDED.tfidf_score
+        tfidf_score = EXCLUDED.tfidf_score,
+        compare_tier = EXCLUDED.compare_tier
         """,
-        (exp_id, system_name_1, system_name_2, diff, match_percentage, is_match, scibert_score, tfidf_score)
+        rows,
+        page_size=len(rows),
     )
 
 
-def get_embedding(text):
+def stored_writeup(normalized_text, write_up):
     """
-    Generate embedding for a given text using SciBERT.
+    normalized_text, or the write_up normalized on the fly until it is backfilled.
     """
-    inputs = tokenizer(
-        text, return_tensors="pt", truncation=True, padding=True, max_length=512
-    )
-    with torch.no_grad():
-        outputs = model(**inputs)
-        embedding = outputs.last_hidden_state[:, 0, :]  # CLS token embedding
-    return embedding
+    if normalized_text is not None:
+        return normalized_text
+    return normalize_writeup(write_up) if write_up is not None else ""
 
 
-def scibert_compare(text1, text2):
+def upload_compr(system_name_1, system_name_2, analysis_date=None, chunk_size=100, workers=0, threads=None):
     """
-    Compare two texts using scibert model followed by cosine similarity.
+    Compare and save every missing comparison of the system pair on the analysis date.
 
-    Pre-trained BERT: Good for general understanding including scientific texts.
-    SciBERT is trained on papers from the corpus of semanticscholar.org.
-    Corpus size is 1.14M papers, 3.1B tokens
-    """
-    try:
-        embedding1 = get_embedding(text1)
-        embedding2 = get_embedding(text2)
-        similarity = cosine_similarity(embedding1.numpy(), embedding2.numpy())
-        return similarity[0][0]
-    except Exception:
-        return 0
-
-
-def tfidf_compare(text1, text2):
-    """
-    Compare two texts using TF-IDF and cosine similarity.
-
-    TF-IDF: Measures word importance in documents.
-    Matrix of Vectors: Represents documents in a high-dimensional space.
-    Cosine Similarity: Measures similarity between these vectors.
+    Args:
+        system_name_1 (str): First system name.
+        system_name_2 (str): Second system name.
+        analysis_date (date): Analysis date, defaults to the latest of system_name_1.
+        chunk_size (int): Writeup pairs fetched, compared and committed together.
+        workers (int): Comparison worker processes, 0 to compare in-process.
+        threads (int): torch threads per comparison worker.
     """
-    try:
-        vectorizer = TfidfVectorizer()
-        tfidf_matrix = vectorizer.fit_transform([text1, text2])
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-        return similarity[0][0]
-    except Exception:
-        return 0
-
-
-def upload_compr(query):
     conn = psycopg2.connect(**DB_CONFIG)
     cursor = conn.cursor()
 
-    cursor.execute(query)
-    exp_ids = [row[0] for row in cursor.fetchall()]
-    for eid in exp_ids:
-        print(eid, '\n')
-
-        cursor.execute(query_retrieve_writeup.format(system_name1, eid))
-        writeup1 = cursor.fetchone()
-        writeup1 = writeup1[0] if writeup1 else "" 
-
-        cursor.execute(query_retrieve_writeup.format(system_name2, eid))
-        writeup2 = cursor.fetchone()
-        writeup2 = writeup2[0] if writeup2 else ""
-
-        diff = "\n".join(
-            unified_diff(writeup1.splitlines(), writeup2.splitlines(), lineterm="")
-        )
-        matcher = SequenceMatcher(None, writeup1, writeup2)
-        match_percentage = matcher.ratio() * 100
-        is_match = match_percentage >= 95
-
-        scibert_score = float(scibert_compare(writeup1, writeup2))
-        tfidf_score = float(tfidf_compare(writeup1, writeup2))
-
-        # print(diff)
-        # print(match_percentage)
-        # print(is_match)
-        # print(scibert_score)
-        # print(tfidf_score)
-
-        save_compr_to_db(
-            cursor,
-            eid,
-            system_name1,
-            system_name2,
-            diff,
-            match_percentage,
-            is_match,
-            scibert_score,
-            tfidf_score,
-        )
-
+    if analysis_date is None:
+        cursor.execute(query_latest_analysis_date, (system_name_1,))
+        analysis_date = cursor.fetchone()[0]
+    print(f"Comparing {system_name_1} with {system_name_2} on {analysis_date}")
+
+    # withhold keeps the cursor open across the per-chunk commits
+    read_cursor = conn.cursor(name="missing_comparisons", withhold=True)
+    read_cursor.itersize = chunk_size
+    read_cursor.execute(
+        query_missing_compr,
+        {
+            "system_name_1": system_name_1,
+            "system_name_2": system_name_2,
+            "analysis_date": analysis_date,
+        },
+    )
     conn.commit()
-    cursor.close()
-    conn.close()
+
+    pool = create_pool(workers, threads) if workers else None
+    cascade = {"threshold": match_threshold}
+    tier_counts = new_tier_counts()
+    total = failed = 0
+    start = time.monotonic()
+    try:
+        while True:
+            chunk = read_cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            pairs = [
+                (stored_writeup(normalized_1, write_up_1), stored_writeup(normalized_2, write_up_2))
+                for _, normalized_1, write_up_1, normalized_2, write_up_2 in chunk
+            ]
+            try:
+                if pool is None:
+                    results, counts = compare_batch(pairs, cascade)
+                else:
+                    counts = new_tier_counts()
+                    results = compare_pairs(pool, pairs, cascade, counts=counts)
+                save_compr_to_db(
+                    cursor,
+                    [
+                        (
+                            row[0],
+                            system_name_1,
+                            system_name_2,
+                            result["diff"],
+                            result["match_percentage"],
+                            result["is_match"],
+                            result["scibert_score"],
+                            result["tfidf_score"],
+                            analysis_date,
+                            result["tier"],
+                        )
+                        for row, result in zip(chunk, results)
+                    ],
+                )
+                conn.commit()
+            except Exception:
+                # left out of the table, so the next run picks the chunk up again
+                conn.rollback()
+                failed += len(chunk)
+                print(f"Chunk {chunk[0][0]}..{chunk[-1][0]} failed:")
+                print(traceback.format_exc())
+                continue
+            tier_counts.update(counts)
+            total += len(chunk)
+            print(
+                f"{total} experiments compared and committed "
+                f"({total / (time.monotonic() - start):.1f}/s)..."
+            )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        read_cursor.close()
+        cursor.close()
+        conn.close()
+
+    print(f"Comparison tiers: {format_tier_counts(tier_counts)}")
+    if failed:
+        print(f"{failed} experiments failed; run again to retry them")
+
 
 if __name__ == "__main__":
-    upload_compr(query_missing_eid)
+    parser = argparse.ArgumentParser(
+        description="Backfill missing writeup comparisons between two systems"
+    )
+    parser.add_argument(
+        "-s1", "--system_name_1", default=system_name1, help=f"First system, defaults to {system_name1}"
+    )
+    parser.add_argument(
+        "-s2", "--system_name_2", default=system_name2, help=f"Second system, defaults to {system_name2}"
+    )
+    parser.add_argument(
+        "-d",
+        "--analysis_date",
+        help="Analysis date (YYYY-MM-DD), defaults to the latest analysis date of the first system",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk_size",
+        type=int,
+        default=100,
+        help="Writeup pairs fetched, compared and committed together",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=0,
+        help="Comparison worker processes, each loading its own SciBERT model; defaults to 0, comparing in-process",
+    )
+    parser.add_argument(
+        "-n",
+        "--threads",
+        type=int,
+        help="torch threads per comparison worker; defaults to cores divided by workers",
+    )
+    args = parser.parse_args()
+    upload_compr(
+        args.system_name_1,
+        args.system_name_2,
+        args.analysis_date,
+        args.chunk_size,
+        args.workers,
+        args.threads,
+    )
@@ -0,0 +1,234 @@
+"""
+Stream ELN_WRITEUP_COMPARISON results to gzip CSV or Parquet files.
+
+The rows are exported with COPY (SELECT ...) TO STDOUT, so Postgres streams
+the CSV straight into the gzip file without building result rows in Python.
+For Parquet the CSV stream is piped into pyarrow, which converts it in record
+batches and writes one row group per batch; memory stays bounded by the batch
+size either way.
+
+Usage:
+    python export_comparisons.py -o comparisons.csv.gz --since 2025-03-01
+    python export_comparisons.py -o mismatches.parquet -s1 prelude-masks -s2 prelude-masks2 --is_match false
+"""
+
+import os
+import gzip
+import argparse
+import threading
+import psycopg2
+from os import getenv
+from datetime import datetime
+from dotenv import load_dotenv
+
+
+load_dotenv(override=True)
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+FORMATS = ("csv", "parquet")
+COLUMNS = [
+    "exp_id",
+    "system_name_1",
+    "system_name_2",
+    "analysis_date",
+    "match_percentage",
+    "is_match",
+    "scibert_score",
+    "tfidf_score",
+    "compare_tier",
+]
+BLOCK_SIZE = 1 << 20
+
+
+def build_query(cursor, columns, since=None, until=None, system_name_1=None, system_name_2=None, is_match=None):
+    """
+    SELECT over ELN_WRITEUP_COMPARISON with the filters bound client side, since
+    COPY does not take query parameters.
+    """
+    conditions, params = [], []
+    for condition, value in (
+        ("analysis_date >= %s", since),
+        ("analysis_date <= %s", until),
+        ("system_name_1 = %s", system_name_1),
+        ("system_name_2 = %s", system_name_2),
+        ("is_match = %s", is_match),
+    ):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    query = f"SELECT {', '.join(columns)} FROM ELN_WRITEUP_COMPARISON"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY analysis_date, exp_id, system_name_1, system_name_2"
+    return cursor.mogrify(query, params).decode()
+
+
+def copy_csv(cursor, query, file):
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", file, size=BLOCK_SIZE)
+
+
+def export_csv(cursor, query, output):
+    with gzip.open(output, "wb") as file:
+        copy_csv(cursor, query, file)
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        "analysis_date": pa.date32(),
+        "match_percentage": pa.float64(),
+        "scibert_score": pa.float64(),
+        "tfidf_score": pa.float64(),
+        "is_match": pa.bool_(),
+    }
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+def export_parquet(cursor, query, output, columns):
+    """
+    Pipe the COPY CSV stream through pyarrow's streaming CSV reader into a
+    Parquet writer, one row group per record batch.
+    """
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns)
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def produce():
+        try:
+            with os.fdopen(write_fd, "wb") as pipe:
+                copy_csv(cursor, query, pipe)
+        except Exception as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    try:
+        with os.fdopen(read_fd, "rb") as pipe:
+            reader = pa_csv.open_csv(
+                pipe,
+                read_options=pa_csv.ReadOptions(block_size=BLOCK_SIZE),
+                # the diff column holds quoted multi-line values
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                # Postgres writes booleans as t/f and NULL as an empty field
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=schema,
+                    true_values=["t"],
+                    false_values=["f"],
+                    strings_can_be_null=True,
+                ),
+            )
+            with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+    except Exception:
+        # the read end is closed, so the producer stops; when COPY failed first,
+        # pyarrow only saw a truncated stream and the COPY error is the real one
+        producer.join()
+        if errors and not isinstance(errors[0], BrokenPipeError):
+            raise errors[0]
+        raise
+    finally:
+        producer.join()
+    if errors:
+        raise errors[0]
+
+
+def export_comparisons(
+    output,
+    fmt=None,
+    since=None,
+    until=None,
+    system_name_1=None,
+    system_name_2=None,
+    is_match=None,
+    with_diff=False,
+):
+    """
+    Export the filtered comparison results to a file.
+
+    Args:
+        output (str): Output path.
+        fmt (str): csv (gzip) or parquet, defaults to the output extension.
+        since (date): First analysis date.
+        until (date): Last analysis date.
+        system_name_1 (str): First system name.
+        system_name_2 (str): Second system name.
+        is_match (bool): Only matches or only mismatches.
+        with_diff (bool): Include the diff column.
+
+    Returns:
+        str: The output path.
+    """
+    fmt = fmt or ("parquet" if output.endswith(".parquet") else "csv")
+    columns = COLUMNS + (["diff"] if with_diff else [])
+    connection = psycopg2.connect(**DB_CONFIG)
+    try:
+        cursor = connection.cursor()
+        query = build_query(cursor, columns, since, until, system_name_1, system_name_2, is_match)
+        if fmt == "parquet":
+            export_parquet(cursor, query, output, columns)
+        else:
+            export_csv(cursor, query, output)
+        cursor.close()
+    finally:
+        connection.close()
+    return output
+
+
+def valid_date(date_str):
+    """
+    Validate that the date string is in the format YYYY-MM-DD.
+    """
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid date format: {date_str}. Expected format: YYYY-MM-DD"
+        )
+
+
+def valid_bool(value):
+    if value.lower() in ("true", "t", "1", "yes"):
+        return True
+    if value.lower() in ("false", "f", "0", "no"):
+        return False
+    raise argparse.ArgumentTypeError(f"Invalid boolean: {value}. Expected true or false")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export ELN writeup comparison results to gzip CSV or Parquet"
+    )
+    parser.add_argument("-o", "--output", required=True, help="Output file, .csv.gz or .parquet")
+    parser.add_argument(
+        "-f", "--format", choices=FORMATS, help="Output format, defaults to the output extension"
+    )
+    parser.add_argument("--since", type=valid_date, help="First analysis date, YYYY-MM-DD")
+    parser.add_argument("--until", type=valid_date, help="Last analysis date, YYYY-MM-DD")
+    parser.add_argument("-s1", "--system_name_1", help="First system name")
+    parser.add_argument("-s2", "--system_name_2", help="Second system name")
+    parser.add_argument(
+        "--is_match", type=valid_bool, help="Only matches (true) or mismatches (false)"
+    )
+    parser.add_argument("--with_diff", action="store_true", help="Include the diff column")
+    args = parser.parse_args()
+    output = export_comparisons(
+        args.output,
+        args.format,
+        args.since,
+        args.until,
+        args.system_name_1,
+        args.system_name_2,
+        args.is_match,
+        args.with_diff,
+    )
+    print(f"Exported to {output}")
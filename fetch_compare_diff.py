@@ -24,53 +24,92 @@ table_header = (
 separator = "-" * len(table_header)
 
 
-def fetch_writeups(exp_ids):
-    query = f"""
-    SELECT
-    e.exp_id,
-    e.system_name,
-    e.analysis_date,
-    e.write_up,
-    c.match_percentage,
-    c.scibert_score,
-    c.tfidf_score
-FROM
-    ELN_WRITEUP_COMPARISON c
-INNER JOIN
-    ELN_WRITEUP_API_EXTRACT e
-    ON c.exp_id = e.exp_id 
-    AND c.system_name_1 = e.system_name
-    AND c.analysis_date = e.analysis_date
-WHERE e.exp_id = ANY(%s)
-GROUP BY
-    e.exp_id,
-    e.system_name,
-    e.write_up,
-    c.match_percentage,
-    c.scibert_score,
-    c.tfidf_score,
-    e.analysis_date
-ORDER BY
-    e.exp_id,
-    e.analysis_date;
-"""
+def format_metric(value):
+    """
+    Format a metric column; pairs decided early in the comparison cascade leave
+    some metrics empty.
+    """
+    if value is None:
+        return f"{'-':<{spaces_metric}}"
+    return f"{value:<{spaces_metric}.2f}"
 
-    connection = psycopg2.connect(
+
+def get_connection():
+    return psycopg2.connect(
         dbname=getenv("DB_NAME"),
         user=getenv("DB_USER"),
         password=getenv("DB_PASS"),
         host=getenv("DB_HOST"),
+        port=getenv("DB_PORT"),
     )
+
+
+def fetch_writeups(connection, exp_ids, analysis_date):
+    """
+    Comparison metrics and writeup previews from the comparison summary.
+
+    Args:
+        connection (connection): Database connection.
+        exp_ids (list): Experiment IDs.
+        analysis_date (date): Analysis date.
+
+    Returns:
+        list: (exp_id, system_name, analysis_date, write_up_preview,
+        match_percentage, scibert_score, tfidf_score) rows.
+    """
+    query = """
+    SELECT
+    exp_id,
+    system_name_1,
+    analysis_date,
+    COALESCE(write_up_preview, ''),
+    match_percentage,
+    scibert_score,
+    tfidf_score
+FROM
+    ELN_WRITEUP_COMPARISON_SUMMARY
+WHERE analysis_date = %s AND exp_id = ANY(%s)
+ORDER BY
+    exp_id,
+    system_name_1,
+    system_name_2;
+"""
     cursor = connection.cursor()
-    cursor.execute(query, (exp_ids,),)
+    cursor.execute(query, (analysis_date, exp_ids))
     results = cursor.fetchall()
     cursor.close()
-    connection.close()
 
     return results
 
 
-def print_results(results):
+def fetch_full_texts(connection, results):
+    """
+    Full writeups of the report rows, fetched in one query when they are printed.
+
+    Returns:
+        dict: (exp_id, system_name, analysis_date) to writeup text.
+    """
+    if not results:
+        return {}
+    cursor = connection.cursor()
+    cursor.execute(
+        """
+        SELECT exp_id, system_name, analysis_date, COALESCE(normalized_text, write_up)
+        FROM ELN_WRITEUP_API_EXTRACT
+        WHERE analysis_date = ANY(%s) AND exp_id = ANY(%s) AND system_name = ANY(%s);
+        """,
+        (
+            list({row[2] for row in results}),
+            list({row[0] for row in results}),
+            list({row[1] for row in results}),
+        ),
+    )
+    texts = {tuple(row[:3]): row[3] for row in cursor.fetchall()}
+    cursor.close()
+    return texts
+
+
+def print_results(results, fetch_texts=None):
     print(table_header)
     print(separator)
 
@@ -89,19 +128,27 @@ def print_results(results):
             f"{system_name:<{spaces_metric+3}} "
             f"{analysis_date.strftime("%Y-%m-%d"):<{spaces_metric+3}}"
             f"{write_up[:spaces_write_up]:<{spaces_write_up}} "
-            f"{match_percentage:<{spaces_metric}.2f} "
-            f"{scibert_score:<{spaces_metric}.2f} "
-            f"{tfidf_score:<{spaces_metric}.2f} "
+            f"{format_metric(match_percentage)} "
+            f"{format_metric(scibert_score)} "
+            f"{format_metric(tfidf_score)} "
         )
         print(formatted_row)
+    if fetch_texts is None:
+        return
+    texts = fetch_texts(results)
     print("\n")
     print("Full Write-Up Texts:")
     print("=" * 50)
-    for exp_id, system_name, analysis_date, write_up, _, _, _ in results:
+    printed = set()
+    for exp_id, system_name, analysis_date, _, _, _, _ in results:
+        # one writeup per system even when it is compared against several systems
+        if (exp_id, system_name, analysis_date) in printed:
+            continue
+        printed.add((exp_id, system_name, analysis_date))
         print(f"Exp ID: {exp_id}")
         print(f"System Name: {system_name}")
         print(f"Analysis Date: {analysis_date.strftime('%Y-%m-%d')}")
-        print(f"Write-Up:\n{write_up}\n")
+        print(f"Write-Up:\n{texts.get((exp_id, system_name, analysis_date), '')}\n")
         print("-" * 50)
 
 def valid_date(date_str):
@@ -134,7 +181,20 @@ if __name__ == "__main__":
         type=valid_date,
         help="Analysis date in format YYYY-MM-DD",
     )
+    parser.add_argument(
+        "-s",
+        "--summary_only",
+        action="store_true",
+        help="Print the metrics table only, without fetching the full write-ups",
+    )
     args = parser.parse_args()
     print()
-    writeups = fetch_writeups(args.exp_ids)
-    print_results(writeups)
+    connection = get_connection()
+    try:
+        writeups = fetch_writeups(connection, args.exp_ids, args.analysis_date)
+        print_results(
+            writeups,
+            None if args.summary_only else lambda results: fetch_full_texts(connection, results),
+        )
+    finally:
+        connection.close()
@@ -0,0 +1,197 @@
+"""
+Saved Dotmatics page fixtures and a local replay server for the writeup scraper.
+
+Fixture format, one directory per experiment:
+
+    <fixtures>/<exp_id>/notebook.html          samplenotebook iframe document
+    <fixtures>/<exp_id>/<domain>.html          optional per-domain iframe override
+    <fixtures>/<exp_id>/experiment.html        optional experiment page; by default
+                                               a page embedding the iframe is served
+    <fixtures>/<exp_id>/expected.json          expected extraction:
+        {"created_date": "2024-02-19", "tables": ["Reactants", ...],
+         "normalized_text": "...", "domains": {"<domain>": {overridden fields}}}
+
+The replay server mimics the parts of the browser the scraper uses, for any
+domain under /<domain>/browser: the login form (any credentials are accepted
+and a session cookie set), testmanager/experiment.jsp and the iframe document.
+Point the scraper at it with
+    python compr_eln_writeup_scrape.py --base-url http://127.0.0.1:8000/{0}/browser -e ...
+
+Usage:
+    python fixture_replay.py -d fixtures/sample -p 8000
+"""
+
+import json
+import argparse
+import threading
+from os import listdir, path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+DEFAULT_FIXTURES = path.join("fixtures", "sample")
+SESSION_COOKIE = "replay_session=1"
+LOGIN_PAGE = """<html><body>
+<form method="post" action="/{0}/browser/login">
+<input type="text" id="isid" name="isid">
+<input type="password" id="password" name="password">
+<input type="submit" class="moduleButton" value="Login">
+</form>
+</body></html>"""
+EXPERIMENT_PAGE = """<html><body>
+<iframe id="samplenotebookiframe" src="notebook.jsp?experiment_id={0}"></iframe>
+</body></html>"""
+
+
+def load_fixture(directory, exp_id):
+    """
+    Read one experiment fixture.
+
+    Returns:
+        dict: notebook html, per-domain overrides, experiment page (or None) and
+        expected extraction (or None).
+    """
+    fixture_dir = path.join(directory, exp_id)
+    fixture = {"exp_id": exp_id, "domains": {}, "experiment": None, "expected": None}
+    for name in listdir(fixture_dir):
+        file_path = path.join(fixture_dir, name)
+        if name == "expected.json":
+            with open(file_path) as file:
+                fixture["expected"] = json.load(file)
+        elif name.endswith(".html"):
+            with open(file_path, encoding="utf-8") as file:
+                html = file.read()
+            key = name[: -len(".html")]
+            if key == "notebook":
+                fixture["notebook"] = html
+            elif key == "experiment":
+                fixture["experiment"] = html
+            else:
+                fixture["domains"][key] = html
+    return fixture
+
+
+def load_fixtures(directory=DEFAULT_FIXTURES):
+    """
+    Read every experiment fixture of a directory.
+
+    Returns:
+        dict: exp_id to fixture.
+    """
+    return {
+        exp_id: load_fixture(directory, exp_id)
+        for exp_id in sorted(listdir(directory))
+        if path.isdir(path.join(directory, exp_id))
+    }
+
+
+def notebook_html(fixture, domain):
+    return fixture["domains"].get(domain, fixture.get("notebook"))
+
+
+def expected_for(fixture, domain=None):
+    """
+    Expected extraction of a fixture for a domain, or None if not recorded.
+    """
+    if fixture["expected"] is None:
+        return None
+    expected = {key: value for key, value in fixture["expected"].items() if key != "domains"}
+    expected.update(fixture["expected"].get("domains", {}).get(domain, {}))
+    return expected
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    fixtures = {}
+
+    def _send(self, status, body="", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) < 2 or parts[1] != "browser":
+            return None, None, None
+        return parts[0], "/".join(parts[2:]), parse_qs(url.query)
+
+    def do_POST(self):
+        domain, page, _ = self._route()
+        if page != "login":
+            return self._send(404)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send(
+            302,
+            headers={
+                "Location": f"/{domain}/browser",
+                "Set-Cookie": f"{SESSION_COOKIE}; Path=/",
+            },
+        )
+
+    def do_GET(self):
+        domain, page, query = self._route()
+        if domain is None:
+            return self._send(404)
+        if SESSION_COOKIE not in self.headers.get("Cookie", ""):
+            return self._send(200, LOGIN_PAGE.format(domain))
+        if page == "":
+            return self._send(200, "<html><body>Logged in</body></html>")
+
+        exp_id = query.get("experiment_id", [None])[0]
+        fixture = self.fixtures.get(exp_id)
+        if fixture is None:
+            return self._send(404)
+        if page == "testmanager/experiment.jsp":
+            return self._send(200, fixture["experiment"] or EXPERIMENT_PAGE.format(exp_id))
+        if page == "testmanager/notebook.jsp":
+            html = notebook_html(fixture, domain)
+            return self._send(200, html) if html is not None else self._send(404)
+        self._send(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(fixtures, port=0, background=True):
+    """
+    Serve the fixtures on 127.0.0.1.
+
+    Args:
+        fixtures (dict): Fixtures from load_fixtures.
+        port (int): Port, 0 for a free one.
+        background (bool): Serve from a daemon thread and return immediately.
+
+    Returns:
+        ThreadingHTTPServer
+    """
+    handler = type("Handler", (ReplayHandler,), {"fixtures": fixtures})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+
+def base_url_template(server):
+    return f"http://127.0.0.1:{server.server_port}/{{0}}/browser"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay saved Dotmatics pages to the writeup scraper"
+    )
+    parser.add_argument("-d", "--directory", default=DEFAULT_FIXTURES, help="Fixture directory")
+    parser.add_argument("-p", "--port", type=int, default=8000, help="Port to listen on")
+    args = parser.parse_args()
+    fixtures = load_fixtures(args.directory)
+    print(
+        f"Replaying {len(fixtures)} experiments at "
+        f"http://127.0.0.1:{args.port}/{{domain}}/browser"
+    )
+    serve(fixtures, args.port, background=False)
@@ -1,6 +1,7 @@
 from flask import Flask
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
+from app.cache import TTLCache
 
 db = SQLAlchemy()
 
@@ -9,6 +10,9 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     db.init_app(app)
+    app.extensions['results_cache'] = TTLCache(
+        app.config.get('RESULTS_CACHE_SIZE', 256), app.config.get('RESULTS_CACHE_TTL', 300)
+    )
 
     from app.api import bp as api_bp
     app.register_blueprint(api_bp)
@@ -1,53 +1,323 @@
-from flask import request, jsonify
+from datetime import date
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
 from app.api import bp
-from app.functions import get_or_create_table
+from app.functions import (
+    ensure_tables,
+    reset_tables,
+    get_user_version,
+    bump_user_version,
+    parse_validity_payload,
+    upsert_validity,
+    select_validity,
+    select_agreement,
+    select_reviewer_agreement,
+    comparison_table,
+    scraped_table,
+    COMPARISON_KEY,
+    COMPARISON_DEFAULT_COLUMNS,
+    SCRAPED_KEY,
+    SCRAPED_DEFAULT_COLUMNS,
+    projection,
+    select_page,
+    comparison_conditions,
+    scraped_conditions,
+    json_value,
+    encode_cursor,
+    decode_cursor,
+)
 from sqlalchemy.exc import SQLAlchemyError
 from app import db
 
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+def bool_arg(name):
+    """Optional true/false query argument; raises ValueError on anything else."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(f'{name} must be true or false')
+
+
+def int_arg(name, default=None, minimum=0, maximum=None):
+    """Optional integer query argument; raises ValueError when invalid or out of range."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+    if value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    if maximum is not None and value > maximum:
+        raise ValueError(f'{name} must be at most {maximum}')
+    return value
+
+
+def float_arg(name):
+    """Optional number query argument; raises ValueError when invalid."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+
+def date_arg(name):
+    """Optional YYYY-MM-DD query argument; raises ValueError when invalid."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a date in the format YYYY-MM-DD')
+
+
+def list_arg(name):
+    """Comma separated query argument as a list, empty when missing."""
+    return [value for value in request.args.get(name, '').split(',') if value]
+
+
+def cached(view):
+    """
+    Serve successful responses of a read-only view from the TTL-bounded LRU
+    results cache, keyed by path and query string.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = current_app.extensions['results_cache']
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        body = cache.get(key)
+        if body is not None:
+            response = current_app.response_class(body, mimetype='application/json')
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            cache.set(key, response.get_data())
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def read_page(table, key, default_columns, conditions):
+    """JSON keyset page of a table for the columns, after and limit query arguments."""
+    after = request.args.get('after')
+    after = decode_cursor(after, table, key) if after else None
+    limit = int_arg('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    columns = projection(table, key, list_arg('columns'), default_columns)
+    # one extra row tells whether there is a next page
+    result = db.session.execute(select_page(table, key, columns, conditions, after, limit + 1))
+    rows = [
+        {name: json_value(value) for name, value in row._mapping.items()}
+        for row in result.fetchall()
+    ]
+    next_after = encode_cursor(rows[limit - 1], key) if len(rows) > limit else None
+    return jsonify({'data': rows[:limit], 'next_after': next_after})
+
 
 @bp.route('/get-data', methods=['GET'])
 def get_data():
-    """Get rows from validity table"""
+    """
+    Get a page of rows from the validity table, ordered by exp_id.
+
+    Query arguments: after (last exp_id of the previous page), limit, valid,
+    invalid, and since (only rows changed after that version). The ETag and
+    Last-Modified headers come from the reviewer's change counter, so an unchanged
+    poll is answered with a 304 after a single counter lookup.
+    """
     user_name = request.args.get('user_name')
     if not user_name:
         return jsonify({'status': 'error', 'message': 'user_name parameter is required'}), 400
     try:
-        table = get_or_create_table(user_name, create=False)
-        stmt = table.select()
-        result = db.session.execute(stmt).fetchall()
-        rows = [{'exp_id': row.exp_id, 'valid': row.valid, 'invalid': row.invalid} for row in result]
-        return jsonify({'data': rows}), 200
+        after = int_arg('after')
+        limit = int_arg('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        since = int_arg('since')
+        valid = bool_arg('valid')
+        invalid = bool_arg('invalid')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        ensure_tables()
+        version, updated_at = get_user_version(user_name)
+        # the URL already names the reviewer, and user names may hold characters an ETag cannot
+        etag = f'validity-{version}'
+        if request.if_none_match.contains_weak(etag) or (
+            not request.if_none_match
+            and updated_at is not None
+            and request.if_modified_since is not None
+            and updated_at.replace(microsecond=0) <= request.if_modified_since
+        ):
+            response = make_response('', 304)
+        else:
+            # one extra row tells whether there is a next page
+            result = db.session.execute(
+                select_validity(user_name, after, limit + 1, valid, invalid, since)
+            ).fetchall()
+            rows = [
+                {'exp_id': row.exp_id, 'valid': row.valid, 'invalid': row.invalid, 'version': row.version}
+                for row in result[:limit]
+            ]
+            next_after = rows[-1]['exp_id'] if len(result) > limit else None
+            response = jsonify({'data': rows, 'version': version, 'next_after': next_after})
+
+        response.set_etag(etag)
+        if updated_at is not None:
+            response.last_modified = updated_at
+        response.cache_control.no_cache = True
+        return response
 
     except SQLAlchemyError as e:
+        reset_tables()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @bp.route('/update-data', methods=['POST'])
 def update_data():
-    """Update rows from the validity table."""
+    """Upsert the posted {exp_id: {"VALID": bool, "INVALID": bool}} rows in one statement."""
     user_name = request.args.get('user_name')
     if not user_name:
         return jsonify({'status': 'error', 'message': 'user_name parameter is required'}), 400
-    
-    table = get_or_create_table(user_name)
-    data = request.json
-    try:
-        for exp_id, states in data.items():
-            stmt = table.select().where(table.c.exp_id == exp_id)
-            result = db.session.execute(stmt).fetchone()
-            if result:
-                stmt = (
-                    table.update()
-                    .where(table.c.exp_id == exp_id)
-                    .values(valid=states['VALID'], invalid=states['INVALID'])
-                )
-            else:
-                stmt = table.insert().values(
-                    exp_id=exp_id, valid=states['VALID'], invalid=states['INVALID']
-                )
-            db.session.execute(stmt)
+
+    try:
+        rows = parse_validity_payload(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        ensure_tables()
+        version = None
+        if rows:
+            version = bump_user_version(user_name)
+            db.session.execute(upsert_validity(user_name, rows, version))
         db.session.commit()
-        return jsonify({'status': 'success'}), 201
+        return jsonify({'status': 'success', 'count': len(rows), 'version': version}), 201
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        reset_tables()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@bp.route('/agreement', methods=['GET'])
+def agreement():
+    """
+    Cross-reviewer counts per experiment, as a keyset page by exp_id.
+
+    Query arguments: user_names (comma separated, defaults to all reviewers),
+    after, limit, min_reviewers, and disputed (only experiments marked valid by
+    some reviewers and invalid by others).
+    """
+    user_names = [name for name in request.args.get('user_names', '').split(',') if name]
+    try:
+        after = int_arg('after')
+        limit = int_arg('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        min_reviewers = int_arg('min_reviewers', 1, 1)
+        disputed = bool_arg('disputed') or False
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        ensure_tables()
+        result = db.session.execute(
+            select_agreement(user_names, after, limit + 1, min_reviewers, disputed)
+        ).fetchall()
+        rows = [
+            {'exp_id': row.exp_id, 'reviewers': row.reviewers, 'valid': row.valid, 'invalid': row.invalid}
+            for row in result[:limit]
+        ]
+        next_after = rows[-1]['exp_id'] if len(result) > limit else None
+        return jsonify({'data': rows, 'next_after': next_after}), 200
+    except SQLAlchemyError as e:
+        reset_tables()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@bp.route('/agreement/reviewers', methods=['GET'])
+def reviewer_agreement():
+    """
+    Pairwise reviewer agreement: experiments flagged by both reviewers of each
+    pair and how many of them they flagged identically.
+    """
+    user_names = [name for name in request.args.get('user_names', '').split(',') if name]
+    try:
+        ensure_tables()
+        result = db.session.execute(select_reviewer_agreement(user_names)).fetchall()
+        rows = [
+            {
+                'user_name_1': row.user_name_1,
+                'user_name_2': row.user_name_2,
+                'shared': row.shared,
+                'agreed': row.agreed,
+            }
+            for row in result
+        ]
+        return jsonify({'data': rows}), 200
+    except SQLAlchemyError as e:
+        reset_tables()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@bp.route('/comparisons', methods=['GET'])
+@cached
+def comparisons():
+    """
+    Page of ELN_WRITEUP_COMPARISON rows in primary key order.
+
+    Query arguments: columns (comma separated, defaults to the key and metrics;
+    add diff explicitly), since, until (analysis_date), system_name_1,
+    system_name_2, min_match, max_match (match_percentage), is_match, after
+    (next_after of the previous page) and limit.
+    """
+    try:
+        conditions = comparison_conditions(
+            date_arg('since'),
+            date_arg('until'),
+            request.args.get('system_name_1'),
+            request.args.get('system_name_2'),
+            float_arg('min_match'),
+            float_arg('max_match'),
+            bool_arg('is_match'),
+        )
+        return read_page(comparison_table, COMPARISON_KEY, COMPARISON_DEFAULT_COLUMNS, conditions)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@bp.route('/scraped', methods=['GET'])
+@cached
+def scraped():
+    """
+    Page of ELN_WRITEUP_SCRAPPED rows in primary key order.
+
+    Query arguments: columns (comma separated, defaults to the key and
+    created_date; add write_up or the chemical tables explicitly), since,
+    until (created_date), system_name, exp_ids (comma separated), after
+    (next_after of the previous page) and limit.
+    """
+    try:
+        conditions = scraped_conditions(
+            date_arg('since'),
+            date_arg('until'),
+            request.args.get('system_name'),
+            list_arg('exp_ids'),
+        )
+        return read_page(scraped_table, SCRAPED_KEY, SCRAPED_DEFAULT_COLUMNS, conditions)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
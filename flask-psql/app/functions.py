@@ -1,27 +1,397 @@
-from sqlalchemy import Table, Column, Integer, Boolean, MetaData
-from sqlalchemy.inspection import inspect
+import json
+import base64
+import threading
+from datetime import date
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import Table, Column, Integer, BigInteger, Boolean, String, Text, Date, DateTime, Numeric, MetaData
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert
 from app import db
 
+MAX_PAYLOAD_ROWS = 10000
 
-def get_or_create_table(user_name, create=True):
-    """Dynamically create or get a table."""
-    engine = db.engine
-    metadata = MetaData()
-    table_name = f"validity_{user_name}"
-
-    inspector = inspect(engine)
-    if table_name in inspector.get_table_names():
-        table = Table(table_name, metadata, autoload_with=engine)
-    else:
-        if create:
-            table = Table(
-                table_name,
-                metadata,
-                Column('exp_id', Integer, primary_key=True),
-                Column('valid', Boolean),
-                Column('invalid', Boolean),
-                extend_existing=True,
-            )
-            table.create(engine)
-    
-    return table
+# one validity table for every reviewer; the primary key carries the flags so
+# a reviewer's page is an index-only scan, and the exp_id index covers the
+# cross-reviewer agreement aggregation
+VALIDITY_DDL = """
+CREATE TABLE IF NOT EXISTS validity (
+    user_name VARCHAR NOT NULL,
+    exp_id INTEGER NOT NULL,
+    valid BOOLEAN,
+    invalid BOOLEAN,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_name, exp_id) INCLUDE (valid, invalid, version)
+){partition_clause};
+{default_partition}
+CREATE INDEX IF NOT EXISTS validity_exp_id_idx ON validity (exp_id) INCLUDE (user_name, valid, invalid);
+CREATE INDEX IF NOT EXISTS validity_user_version_idx ON validity (user_name, version);
+
+CREATE TABLE IF NOT EXISTS validity_user_versions (
+    user_name VARCHAR PRIMARY KEY,
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+"""
+PARTITION_PREFIX = "validity_part_"
+
+metadata = MetaData()
+validity_table = Table(
+    'validity',
+    metadata,
+    Column('user_name', String, primary_key=True),
+    Column('exp_id', Integer, primary_key=True),
+    Column('valid', Boolean),
+    Column('invalid', Boolean),
+    Column('version', BigInteger, nullable=False, server_default='0'),
+)
+# change counter per reviewer; every update-data commit bumps it and stamps
+# the rows it wrote with the new version
+versions_table = Table(
+    'validity_user_versions',
+    metadata,
+    Column('user_name', String, primary_key=True),
+    Column('version', BigInteger, nullable=False),
+    Column('updated_at', DateTime(timezone=True), nullable=False),
+)
+# tables written by the comparison and scraper scripts; only read here
+comparison_table = Table(
+    'eln_writeup_comparison',
+    metadata,
+    Column('exp_id', String, primary_key=True),
+    Column('system_name_1', String, primary_key=True),
+    Column('system_name_2', String, primary_key=True),
+    Column('analysis_date', Date, primary_key=True),
+    Column('match_percentage', Numeric),
+    Column('is_match', Boolean),
+    Column('scibert_score', Numeric),
+    Column('tfidf_score', Numeric),
+    Column('compare_tier', String),
+    Column('diff', Text),
+)
+scraped_table = Table(
+    'eln_writeup_scrapped',
+    metadata,
+    Column('exp_id', String, primary_key=True),
+    Column('system_name', String, primary_key=True),
+    Column('created_date', Date),
+    Column('reactants_table', Text),
+    Column('solvents_table', Text),
+    Column('products_table', Text),
+    Column('write_up', Text),
+    Column('normalized_text', Text),
+    Column('reactants', JSONB),
+    Column('solvents', JSONB),
+    Column('products', JSONB),
+)
+# keyset order is the primary key, so pages walk its index
+COMPARISON_KEY = ('exp_id', 'system_name_1', 'system_name_2', 'analysis_date')
+COMPARISON_DEFAULT_COLUMNS = COMPARISON_KEY + (
+    'match_percentage', 'is_match', 'scibert_score', 'tfidf_score', 'compare_tier',
+)
+SCRAPED_KEY = ('exp_id', 'system_name')
+SCRAPED_DEFAULT_COLUMNS = SCRAPED_KEY + ('created_date',)
+
+# the DDL runs once per process, so steady-state requests only run their own statements
+tables_ready = False
+tables_lock = threading.Lock()
+
+
+def create_tables(engine, partitioned=False):
+    """
+    Create the validity and version tables if they do not exist.
+
+    Args:
+        engine (Engine): Database engine.
+        partitioned (bool): List-partition validity by user_name, with a default
+            partition for reviewers without their own.
+    """
+    ddl = VALIDITY_DDL.format(
+        partition_clause=" PARTITION BY LIST (user_name)" if partitioned else "",
+        default_partition=(
+            f"CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}default PARTITION OF validity DEFAULT;"
+            if partitioned else ""
+        ),
+    )
+    with engine.begin() as connection:
+        connection.execute(text(ddl))
+
+
+def create_user_partition(engine, user_name):
+    """Give a reviewer their own partition of a partitioned validity table."""
+    partition = engine.dialect.identifier_preparer.quote(PARTITION_PREFIX + user_name)
+    # partition bounds are DDL and cannot be bound parameters
+    value = "'" + user_name.replace("'", "''") + "'"
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF validity FOR VALUES IN ({value})"
+        ))
+
+
+def ensure_tables():
+    """Create the tables on the first request of the process."""
+    global tables_ready
+    if tables_ready:
+        return
+    with tables_lock:
+        if not tables_ready:
+            create_tables(db.engine, current_app.config.get('VALIDITY_PARTITIONED', False))
+            tables_ready = True
+
+
+def reset_tables():
+    """Check the tables again on the next request, e.g. after a failed statement."""
+    global tables_ready
+    with tables_lock:
+        tables_ready = False
+
+
+def get_user_version(user_name):
+    """(version, updated_at) of a reviewer; (0, None) before their first tracked write."""
+    row = db.session.execute(
+        select(versions_table.c.version, versions_table.c.updated_at)
+        .where(versions_table.c.user_name == user_name)
+    ).fetchone()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def bump_user_version(user_name):
+    """
+    Increment the change counter of a reviewer in the current transaction.
+
+    The counter row stays locked until commit, so concurrent writers of the same
+    reviewer commit in version order and a since-version read never skips a write.
+    """
+    stmt = insert(versions_table).values(user_name=user_name, version=1, updated_at=func.now())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[versions_table.c.user_name],
+        set_={'version': versions_table.c.version + 1, 'updated_at': stmt.excluded.updated_at},
+    )
+    return db.session.execute(stmt.returning(versions_table.c.version)).scalar_one()
+
+
+def parse_validity_payload(data):
+    """
+    Validate an update-data payload of {exp_id: {"VALID": bool, "INVALID": bool}}.
+
+    Raises ValueError with a message for the client on a malformed payload.
+    Returns the rows as exp_id/valid/invalid dicts, one per exp_id.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object of exp_id: {VALID, INVALID}')
+    if len(data) > MAX_PAYLOAD_ROWS:
+        raise ValueError(f'At most {MAX_PAYLOAD_ROWS} rows can be updated per request')
+
+    rows = {}
+    for key, states in data.items():
+        try:
+            exp_id = int(key)
+        except ValueError:
+            raise ValueError(f'Invalid exp_id: {key}')
+        if not isinstance(states, dict):
+            raise ValueError(f'States of {key} must be an object with VALID and INVALID')
+        for state in ('VALID', 'INVALID'):
+            # the review notebook posts its checkbox states as 1/0
+            value = states.get(state)
+            if not isinstance(value, int) or value not in (0, 1):
+                raise ValueError(f'{state} of {key} must be true/false or 1/0')
+        # "7" and "07" are the same row, and one upsert cannot touch a row twice
+        rows[exp_id] = {
+            'exp_id': exp_id,
+            'valid': bool(states['VALID']),
+            'invalid': bool(states['INVALID']),
+        }
+    return list(rows.values())
+
+
+def upsert_validity(user_name, rows, version):
+    """Single INSERT ... ON CONFLICT (user_name, exp_id) DO UPDATE statement stamping the rows with version."""
+    table = validity_table
+    stmt = insert(table).values([dict(row, user_name=user_name, version=version) for row in rows])
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_name, table.c.exp_id],
+        set_={
+            'valid': stmt.excluded.valid,
+            'invalid': stmt.excluded.invalid,
+            'version': stmt.excluded.version,
+        },
+    )
+
+
+def select_validity(user_name, after=None, limit=None, valid=None, invalid=None, since=None):
+    """Keyset page of a reviewer's rows ordered by exp_id, with optional filters."""
+    table = validity_table
+    stmt = (
+        select(table.c.exp_id, table.c.valid, table.c.invalid, table.c.version)
+        .where(table.c.user_name == user_name)
+    )
+    if after is not None:
+        stmt = stmt.where(table.c.exp_id > after)
+    if valid is not None:
+        stmt = stmt.where(table.c.valid.is_(valid))
+    if invalid is not None:
+        stmt = stmt.where(table.c.invalid.is_(invalid))
+    if since is not None:
+        stmt = stmt.where(table.c.version > since)
+    stmt = stmt.order_by(table.c.exp_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def select_agreement(user_names=None, after=None, limit=None, min_reviewers=1, disputed=False):
+    """
+    Per-experiment reviewer counts: how many reviewers flagged each exp_id and
+    how many of them marked it valid or invalid, as a keyset page by exp_id.
+
+    Args:
+        user_names (list): Only count these reviewers, defaults to all.
+        after (int): Last exp_id of the previous page.
+        limit (int): Page size.
+        min_reviewers (int): Only experiments flagged by at least this many reviewers.
+        disputed (bool): Only experiments marked valid by some reviewers and
+            invalid by others.
+    """
+    table = validity_table
+    reviewers = func.count()
+    valid_count = func.count().filter(table.c.valid.is_(True))
+    invalid_count = func.count().filter(table.c.invalid.is_(True))
+    stmt = select(
+        table.c.exp_id,
+        reviewers.label('reviewers'),
+        valid_count.label('valid'),
+        invalid_count.label('invalid'),
+    )
+    if user_names:
+        stmt = stmt.where(table.c.user_name.in_(user_names))
+    if after is not None:
+        stmt = stmt.where(table.c.exp_id > after)
+    stmt = stmt.group_by(table.c.exp_id).having(reviewers >= min_reviewers)
+    if disputed:
+        stmt = stmt.having(valid_count > 0).having(invalid_count > 0)
+    stmt = stmt.order_by(table.c.exp_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def select_reviewer_agreement(user_names=None):
+    """
+    Pairwise reviewer agreement: for every pair of reviewers, the experiments
+    both flagged and how many of them they flagged identically.
+    """
+    first = validity_table.alias('reviewer_1')
+    second = validity_table.alias('reviewer_2')
+    agreed = func.count().filter(
+        first.c.valid.is_not_distinct_from(second.c.valid)
+        & first.c.invalid.is_not_distinct_from(second.c.invalid)
+    )
+    stmt = (
+        select(
+            first.c.user_name.label('user_name_1'),
+            second.c.user_name.label('user_name_2'),
+            func.count().label('shared'),
+            agreed.label('agreed'),
+        )
+        .select_from(first.join(
+            second,
+            (second.c.exp_id == first.c.exp_id) & (second.c.user_name > first.c.user_name),
+        ))
+    )
+    if user_names:
+        stmt = stmt.where(first.c.user_name.in_(user_names), second.c.user_name.in_(user_names))
+    return stmt.group_by(first.c.user_name, second.c.user_name).order_by(
+        first.c.user_name, second.c.user_name
+    )
+
+
+def projection(table, key, columns=None, default=()):
+    """
+    Key columns followed by the requested columns of a table.
+
+    Raises ValueError on a column the table does not have.
+    """
+    columns = columns or default
+    unknown = [name for name in columns if name not in table.c]
+    if unknown:
+        raise ValueError(f'Unknown columns: {", ".join(unknown)}')
+    return [table.c[name] for name in key + tuple(name for name in columns if name not in key)]
+
+
+def select_page(table, key, columns, conditions=(), after=None, limit=None):
+    """Keyset page of a table in key order: rows after the after key values."""
+    key_columns = [table.c[name] for name in key]
+    stmt = select(*columns).where(*conditions)
+    if after is not None:
+        stmt = stmt.where(tuple_(*key_columns) > tuple_(*after))
+    stmt = stmt.order_by(*key_columns)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def comparison_conditions(since=None, until=None, system_name_1=None, system_name_2=None,
+                          min_match=None, max_match=None, is_match=None):
+    """WHERE conditions of a comparison page."""
+    table = comparison_table
+    conditions = []
+    if since is not None:
+        conditions.append(table.c.analysis_date >= since)
+    if until is not None:
+        conditions.append(table.c.analysis_date <= until)
+    if system_name_1 is not None:
+        conditions.append(table.c.system_name_1 == system_name_1)
+    if system_name_2 is not None:
+        conditions.append(table.c.system_name_2 == system_name_2)
+    if min_match is not None:
+        conditions.append(table.c.match_percentage >= min_match)
+    if max_match is not None:
+        conditions.append(table.c.match_percentage <= max_match)
+    if is_match is not None:
+        conditions.append(table.c.is_match.is_(is_match))
+    return conditions
+
+
+def scraped_conditions(since=None, until=None, system_name=None, exp_ids=None):
+    """WHERE conditions of a scraped rows page."""
+    table = scraped_table
+    conditions = []
+    if since is not None:
+        conditions.append(table.c.created_date >= since)
+    if until is not None:
+        conditions.append(table.c.created_date <= until)
+    if system_name is not None:
+        conditions.append(table.c.system_name == system_name)
+    if exp_ids:
+        conditions.append(table.c.exp_id.in_(exp_ids))
+    return conditions
+
+
+def json_value(value):
+    """NUMERIC and DATE values as JSON numbers and ISO dates."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(row, key):
+    """Opaque next-page token of the key values of the last row."""
+    values = [json_value(row[name]) for name in key]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(token, table, key):
+    """Key values of a next-page token; raises ValueError on a malformed token."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(values, list) or len(values) != len(key):
+            raise ValueError
+        return [
+            date.fromisoformat(value) if isinstance(table.c[name].type, Date) else value
+            for name, value in zip(key, values)
+        ]
+    except (ValueError, TypeError):
+        raise ValueError('Invalid after cursor')
@@ -0,0 +1,141 @@
+"""
+Load benchmark of the validity API against the configured database.
+
+Sends concurrent requests through the Flask test client and reports the
+latency percentiles and the SQL statements per request for a full get-data
+page, an unchanged get-data poll answered with a 304, and the cross-reviewer
+agreement page. With --batch_sizes it also times update-data payloads of
+growing size, which are upserted in a single statement.
+
+Usage:
+    python bench_api.py -u alice -r 500 -c 8
+    python bench_api.py -u alice -b 10 100 1000 5000
+"""
+
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
+from app import create_app, db
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(app, path, query, requests, concurrency, headers=None, status=200):
+    """
+    Time concurrent GET requests.
+
+    Args:
+        app (Flask): Application.
+        path (str): Endpoint path.
+        query (dict): Query string.
+        requests (int): Requests sent.
+        concurrency (int): Concurrent clients.
+        headers (dict): Request headers.
+        status (int): Expected response status.
+
+    Returns:
+        tuple: (request latencies in ms, SQL statements executed)
+    """
+    statements = [0]
+    lock = threading.Lock()
+
+    def count(*args):
+        with lock:
+            statements[0] += 1
+
+    def request(_):
+        with app.test_client() as client:
+            start = time.perf_counter()
+            response = client.get(path, query_string=query, headers=headers)
+            elapsed = (time.perf_counter() - start) * 1000
+        assert response.status_code == status, response.get_json()
+        return elapsed
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies = list(executor.map(request, range(requests)))
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return latencies, statements[0]
+
+
+def run_updates(app, user_name, batch_size, repeats=5):
+    """
+    Time update-data requests of batch_size rows.
+
+    Returns:
+        tuple: (median latency in ms, SQL statements per request)
+    """
+    payload = {
+        str(exp_id): {'VALID': exp_id % 2, 'INVALID': 1 - exp_id % 2}
+        for exp_id in range(1, batch_size + 1)
+    }
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    latencies = []
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        with app.test_client() as client:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                response = client.post(
+                    '/api/update-data', query_string={'user_name': user_name}, json=payload
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 201, response.get_json()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return percentile(latencies, 0.5), statements[0] / repeats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the validity API")
+    parser.add_argument("-u", "--user_name", default="bench", help="Validity table user")
+    parser.add_argument("-r", "--requests", type=int, default=500, help="Requests per run")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument(
+        "-b", "--batch_sizes", type=int, nargs="+", help="Also time update-data with these row counts"
+    )
+    args = parser.parse_args()
+
+    app = create_app()
+    # creates the tables and gives the reviewer a version to poll
+    run_updates(app, args.user_name, 100, repeats=1)
+    with app.test_client() as client:
+        etag = client.get('/api/get-data', query_string={'user_name': args.user_name}).headers['ETag']
+
+    query = {'user_name': args.user_name}
+    for label, path, headers, status in (
+        ("get-data", '/api/get-data', None, 200),
+        ("304 poll", '/api/get-data', {'If-None-Match': etag}, 304),
+        ("agreement", '/api/agreement', None, 200),
+    ):
+        # warm up the connection pool
+        run(app, path, query, args.concurrency, args.concurrency, headers, status)
+        latencies, statements = run(app, path, query, args.requests, args.concurrency, headers, status)
+        print(
+            f"{label:>9}: p50 {percentile(latencies, 0.5):.2f} ms, "
+            f"p95 {percentile(latencies, 0.95):.2f} ms, "
+            f"p99 {percentile(latencies, 0.99):.2f} ms, "
+            f"{statements / args.requests:.1f} SQL statements/request"
+        )
+
+    for batch_size in args.batch_sizes or []:
+        latency, statements = run_updates(app, args.user_name, batch_size)
+        print(
+            f"update {batch_size:>6} rows: p50 {latency:.2f} ms, "
+            f"{statements:.1f} SQL statements/request"
+        )
@@ -0,0 +1,140 @@
+"""
+Move the per-reviewer validity_{user_name} tables into the consolidated
+validity table keyed by (user_name, exp_id).
+
+Each legacy table is copied in its own transaction with its change counter
+from validity_versions. Rows already in validity are kept, so the migration can
+be run again after a partial run or while reviewers are still saving. With
+--partitioned the validity table is created list-partitioned by user_name and
+every migrated reviewer gets their own partition; reviewers added later land in
+the default partition. --drop removes each legacy table once it is copied.
+
+Usage:
+    python migrate_validity.py --dry_run
+    python migrate_validity.py --partitioned --drop
+"""
+
+import argparse
+from sqlalchemy import text
+from sqlalchemy.inspection import inspect
+from app import create_app, db
+from app.functions import create_tables, create_user_partition, PARTITION_PREFIX
+
+LEGACY_PREFIX = "validity_"
+LEGACY_VERSIONS_TABLE = "validity_versions"
+NEW_TABLES = {"validity", "validity_user_versions", LEGACY_VERSIONS_TABLE}
+
+
+def legacy_tables(engine):
+    """Names of the per-reviewer validity tables."""
+    return sorted(
+        name
+        for name in inspect(engine).get_table_names()
+        if name.startswith(LEGACY_PREFIX)
+        and name not in NEW_TABLES
+        and not name.startswith(PARTITION_PREFIX)
+    )
+
+
+def is_partitioned(connection):
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'validity'::regclass)"
+    )).scalar()
+
+
+def migrate_table(engine, table_name, partitioned=False, drop=False):
+    """
+    Copy one legacy table and its change counter into the validity tables.
+
+    Args:
+        engine (Engine): Database engine.
+        table_name (str): Legacy validity_{user_name} table.
+        partitioned (bool): Create a partition for the reviewer first.
+        drop (bool): Drop the legacy table in the same transaction.
+
+    Returns:
+        int: Rows copied.
+    """
+    user_name = table_name[len(LEGACY_PREFIX):]
+    inspector = inspect(engine)
+    # tables created before the change counter have no version column
+    columns = {column["name"] for column in inspector.get_columns(table_name)}
+    version = "version" if "version" in columns else "0"
+    source = engine.dialect.identifier_preparer.quote(table_name)
+
+    if partitioned:
+        create_user_partition(engine, user_name)
+    with engine.begin() as connection:
+        copied = connection.execute(
+            text(
+                f"""
+                INSERT INTO validity (user_name, exp_id, valid, invalid, version)
+                SELECT :user_name, exp_id, valid, invalid, {version} FROM {source}
+                ON CONFLICT (user_name, exp_id) DO NOTHING
+                """
+            ),
+            {"user_name": user_name},
+        ).rowcount
+        if inspector.has_table(LEGACY_VERSIONS_TABLE):
+            connection.execute(
+                text(
+                    f"""
+                    INSERT INTO validity_user_versions (user_name, version, updated_at)
+                    SELECT :user_name, version, updated_at FROM {LEGACY_VERSIONS_TABLE}
+                    WHERE table_name = :table_name
+                    ON CONFLICT (user_name) DO UPDATE SET
+                        version = GREATEST(validity_user_versions.version, EXCLUDED.version),
+                        updated_at = GREATEST(validity_user_versions.updated_at, EXCLUDED.updated_at)
+                    """
+                ),
+                {"user_name": user_name, "table_name": table_name},
+            )
+        if drop:
+            connection.execute(text(f"DROP TABLE {source}"))
+    return copied
+
+
+def migrate(engine, partitioned=False, drop=False, dry_run=False):
+    tables = legacy_tables(engine)
+    if dry_run:
+        for table_name in tables:
+            print(f"{table_name} -> validity (user_name = {table_name[len(LEGACY_PREFIX):]!r})")
+        return
+
+    create_tables(engine, partitioned)
+    with engine.connect() as connection:
+        if partitioned and not is_partitioned(connection):
+            raise SystemExit("validity already exists without partitioning; drop it or migrate without --partitioned")
+
+    total = 0
+    for table_name in tables:
+        copied = migrate_table(engine, table_name, partitioned, drop)
+        total += copied
+        print(f"{table_name}: {copied} rows copied{', dropped' if drop else ''}")
+    if drop and inspect(engine).has_table(LEGACY_VERSIONS_TABLE):
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE {LEGACY_VERSIONS_TABLE}"))
+    print(f"{len(tables)} tables migrated, {total} rows copied")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move the per-reviewer validity tables into the consolidated validity table"
+    )
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="List-partition validity by user_name, one partition per migrated reviewer",
+    )
+    parser.add_argument("--drop", action="store_true", help="Drop each legacy table once copied")
+    parser.add_argument("--dry_run", action="store_true", help="Only list the tables to migrate")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        migrate(
+            db.engine,
+            args.partitioned or app.config.get("VALIDITY_PARTITIONED", False),
+            args.drop,
+            args.dry_run,
+        )
@@ -0,0 +1,202 @@
+"""
+Browserless fetching of Dotmatics notebook pages for the writeup scraper.
+
+The session is authenticated once per domain, either through the Selenium
+login form (the cookies are exported from the browser, which is then closed)
+or with a plain form POST. Experiment pages and their samplenotebook iframe
+documents are then fetched with a pooled aiohttp session running on a
+background event loop, and parsed offline by writeup_parser. This only works
+where the iframe content is served as html and does not need JavaScript to
+render.
+"""
+
+import asyncio
+import logging
+import threading
+import aiohttp
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from driver_pool import create_driver, login
+from writeup_parser import PARSER
+
+
+LOGIN_MODES = ("selenium", "form")
+DEFAULT_LOGIN_MODE = "selenium"
+DEFAULT_CONNECTIONS = 8
+REQUEST_TIMEOUT = 30
+
+
+class SessionExpired(Exception):
+    """
+    Raised when a page comes back as the login form.
+    """
+
+
+def selenium_cookies(base_url, user, password):
+    """
+    Log in with a headless browser once and export its session cookies.
+
+    Returns:
+        dict: Cookie name to value.
+    """
+    driver = create_driver()
+    try:
+        login(driver, base_url, user, password)
+        WebDriverWait(driver, 20).until_not(
+            EC.presence_of_element_located((By.ID, "isid"))
+        )
+        return {cookie["name"]: cookie["value"] for cookie in driver.get_cookies()}
+    finally:
+        driver.quit()
+
+
+def is_login_page(html):
+    return 'id="isid"' in html or "id='isid'" in html
+
+
+def login_form(html):
+    """
+    Action and fields of the login form, with the hidden inputs prefilled.
+
+    Returns:
+        tuple: (action, fields dict, user field name, password field name)
+    """
+    soup = BeautifulSoup(html, PARSER)
+    user_input = soup.find("input", id="isid")
+    password_input = soup.find("input", id="password")
+    form = user_input.find_parent("form") if user_input else None
+    if form is None or password_input is None:
+        raise ValueError("Login form not found")
+    fields = {
+        field["name"]: field.get("value", "")
+        for field in form.find_all("input")
+        if field.get("name") and field.get("type", "text") != "submit"
+    }
+    return (
+        form.get("action", ""),
+        fields,
+        user_input.get("name", "isid"),
+        password_input.get("name", "password"),
+    )
+
+
+def iframe_src(html):
+    """
+    src of the samplenotebook iframe in an experiment page, or None.
+    """
+    iframe = BeautifulSoup(html, PARSER).find("iframe", id="samplenotebookiframe")
+    return iframe.get("src") if iframe else None
+
+
+class HttpFetcher:
+    """
+    Authenticated, pooled HTTP session for one domain on a background event loop.
+
+    The blocking methods can be called from any thread (e.g. the scrape workers
+    of scrape_scheduler); requests are multiplexed over at most connections
+    keep-alive connections.
+
+    Args:
+        base_url (str): Browser base url of the domain.
+        user (str): DM user.
+        password (str): DM password.
+        login_mode (str): selenium or form.
+        connections (int): Maximum concurrent connections to the domain.
+    """
+
+    def __init__(self, base_url, user, password, login_mode=DEFAULT_LOGIN_MODE, connections=DEFAULT_CONNECTIONS):
+        self.base_url = base_url
+        self.user = user
+        self.password = password
+        self.login_mode = login_mode
+        # bumped on every login, so threads that saw the same expired session log in once
+        self.logins = 0
+        self.login_lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.session = self._run(self._open(connections))
+        self._login()
+        logging.info(f"HTTP session ready for {base_url} ({login_mode} login)")
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _open(self, connections):
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=connections),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            # unsafe so cookies are also kept for IP address hosts, e.g. a local replay server
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+        )
+
+    async def _set_cookies(self, cookies):
+        self.session.cookie_jar.update_cookies(cookies)
+
+    def _login(self):
+        if self.login_mode == "selenium":
+            cookies = selenium_cookies(self.base_url, self.user, self.password)
+            self._run(self._set_cookies(cookies))
+        else:
+            self._run(self._form_login(self.user, self.password))
+        self.logins += 1
+
+    def _relogin(self, logins):
+        """
+        Log in again, unless another thread already did since logins.
+        """
+        with self.login_lock:
+            if self.logins == logins:
+                logging.warning(f"Session expired for {self.base_url}, logging in again")
+                self._login()
+
+    async def _get(self, url):
+        async with self.session.get(url) as response:
+            response.raise_for_status()
+            return str(response.url), await response.text()
+
+    async def _form_login(self, user, password):
+        login_url, html = await self._get(self.base_url)
+        action, fields, user_field, password_field = login_form(html)
+        fields[user_field] = user
+        fields[password_field] = password
+        async with self.session.post(urljoin(login_url, action), data=fields) as response:
+            response.raise_for_status()
+            if is_login_page(await response.text()):
+                raise ValueError(f"Form login failed for {self.base_url}")
+
+    async def _notebook(self, path):
+        page_url, page = await self._get(self.base_url + path)
+        if is_login_page(page):
+            raise SessionExpired(f"Session expired for {self.base_url}")
+        src = iframe_src(page)
+        if src is None:
+            raise ValueError(f"samplenotebook iframe not found in {page_url}")
+        _, notebook = await self._get(urljoin(page_url, src))
+        return notebook
+
+    def notebook_html(self, path):
+        """
+        Fetch the samplenotebook iframe document of an experiment page.
+
+        Args:
+            path (str): Experiment page path relative to the base url.
+
+        Returns:
+            str: Iframe html.
+        """
+        logins = self.logins
+        try:
+            return self._run(self._notebook(path))
+        except SessionExpired:
+            self._relogin(logins)
+            return self._run(self._notebook(path))
+
+    def close(self):
+        self._run(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,342 @@
+"""
+MinHash signatures and an LSH banding index over the stored ELN writeups.
+
+Finds experiments whose writeups were copied or templated from other experiments
+without pairwise comparison of the whole ELN_WRITEUP_API_EXTRACT table.
+
+Signatures:
+    Each writeup is reduced to a set of hashed word shingles; NUM_PERM universal
+    hash functions are applied to the whole set at once with NumPy and the
+    per-function minimum kept. The fraction of equal signature slots estimates
+    the Jaccard similarity of the shingle sets. Signatures are stored as uint32
+    bytes in the minhash column of ELN_WRITEUP_API_EXTRACT.
+
+LSH banding:
+    The signature is split into BANDS bands of ROWS rows; writeups sharing any
+    identical band are candidates and are verified against the estimated Jaccard,
+    so a query only touches its own buckets instead of every stored writeup.
+
+Usage:
+    python minhash_lsh.py build
+    python minhash_lsh.py query -e 123456 -t 0.8
+    python minhash_lsh.py clusters -t 0.9 -o near_duplicates.csv
+"""
+
+import zlib
+import csv
+import argparse
+import psycopg2
+import psycopg2.extras
+import numpy as np
+from os import getenv
+from collections import defaultdict
+from dotenv import load_dotenv
+from compare_modules import normalize_text
+
+
+load_dotenv(override=True)
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+SEED = 1
+PRIME = np.uint64(4294967291)  # largest prime below 2**32
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+
+_rng = np.random.default_rng(SEED)
+_perm_a = _rng.integers(1, 2**31, size=NUM_PERM, dtype=np.uint64)
+_perm_b = _rng.integers(0, 2**31, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """
+    crc32 hashes of the unique word shingles of a writeup.
+
+    Args:
+        text (str): Writeup text.
+        size (int): Number of words per shingle.
+
+    Returns:
+        np.ndarray: uint64 array of shingle hashes.
+    """
+    words = normalize_text(text).lower().split(" ")
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    shingles = {
+        " ".join(words[i : i + size]).encode("utf-8")
+        for i in range(len(words) - size + 1)
+    }
+    return np.fromiter(
+        (zlib.crc32(shingle) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def minhash_signature(text):
+    """
+    MinHash signature of a writeup.
+
+    Returns:
+        np.ndarray: uint32 array of length NUM_PERM.
+    """
+    hashes = shingle_hashes(text)
+    # (a * h + b) mod p for every hash function and shingle; a, b < 2**31 and
+    # h < 2**32 so the products fit in uint64
+    values = (_perm_a[:, None] * hashes[None, :] + _perm_b[:, None]) % PRIME
+    return values.min(axis=1).astype(np.uint32)
+
+
+def signature_to_bytes(signature):
+    return signature.astype("<u4").tobytes()
+
+
+def signature_from_bytes(data):
+    return np.frombuffer(bytes(data), dtype="<u4")
+
+
+def estimate_jaccard(signature1, signature2):
+    """
+    Estimated Jaccard similarity of the writeups behind two signatures.
+    """
+    return float(np.mean(signature1 == signature2))
+
+
+class LSHIndex:
+    """
+    LSH banding index over MinHash signatures.
+
+    The Jaccard level at which writeups become likely candidates is roughly
+    (1 / bands) ** (1 / rows); results are verified with the full signature.
+    """
+
+    def __init__(self, bands=BANDS, rows=ROWS):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+        self.signatures = {}
+
+    def _band_keys(self, signature):
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self.buckets[band][band_key].append(key)
+
+    def candidates(self, signature):
+        found = set()
+        for band, band_key in enumerate(self._band_keys(signature)):
+            found.update(self.buckets[band].get(band_key, ()))
+        return found
+
+    def query(self, signature, threshold=0.8, exclude=None):
+        """
+        All indexed writeups with estimated Jaccard >= threshold to the signature.
+
+        Returns:
+            list: (key, jaccard) tuples, most similar first.
+        """
+        results = []
+        for key in self.candidates(signature):
+            if key == exclude:
+                continue
+            jaccard = estimate_jaccard(signature, self.signatures[key])
+            if jaccard >= threshold:
+                results.append((key, jaccard))
+        return sorted(results, key=lambda item: item[1], reverse=True)
+
+    def clusters(self, threshold=0.8):
+        """
+        Near-duplicate clusters: connected components of verified candidate
+        pairs sharing a bucket.
+
+        Returns:
+            list: Lists of keys, largest cluster first; singletons omitted.
+        """
+        parent = {}
+
+        def find(key):
+            parent.setdefault(key, key)
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for band_buckets in self.buckets:
+            for keys in band_buckets.values():
+                # compare each bucket member against a representative; members
+                # that fail start the next round with their own representative
+                while len(keys) > 1:
+                    first, remaining = keys[0], []
+                    for other in keys[1:]:
+                        if find(first) == find(other):
+                            continue
+                        jaccard = estimate_jaccard(
+                            self.signatures[first], self.signatures[other]
+                        )
+                        if jaccard >= threshold:
+                            parent[find(other)] = find(first)
+                        else:
+                            remaining.append(other)
+                    keys = remaining
+
+        groups = defaultdict(list)
+        for key in parent:
+            groups[find(key)].append(key)
+        return sorted(
+            (sorted(group) for group in groups.values() if len(group) > 1),
+            key=len,
+            reverse=True,
+        )
+
+
+def build_signatures(batch_size=500):
+    """
+    Compute and store signatures for stored writeups that have none yet.
+    """
+    connection = psycopg2.connect(**DB_CONFIG)
+    read_cursor = connection.cursor(name="minhash_build")
+    read_cursor.itersize = batch_size
+    read_cursor.execute(
+        """
+        SELECT exp_id, system_name, analysis_date, COALESCE(normalized_text, write_up)
+        FROM ELN_WRITEUP_API_EXTRACT
+        WHERE minhash IS NULL
+        """
+    )
+    cursor = connection.cursor()
+    total = 0
+    while True:
+        batch = read_cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        psycopg2.extras.execute_batch(
+            cursor,
+            """
+            UPDATE ELN_WRITEUP_API_EXTRACT SET minhash = %s
+            WHERE exp_id = %s AND system_name = %s AND analysis_date = %s
+            """,
+            [
+                (
+                    psycopg2.Binary(signature_to_bytes(minhash_signature(write_up))),
+                    exp_id,
+                    system_name,
+                    analysis_date,
+                )
+                for exp_id, system_name, analysis_date, write_up in batch
+            ],
+        )
+        total += len(batch)
+        print(f"{total} signatures computed...")
+    read_cursor.close()
+    connection.commit()
+    cursor.close()
+    connection.close()
+    print(f"{total} signatures stored")
+
+
+def load_index(system_name=None, analysis_date=None):
+    """
+    Build an LSHIndex from the stored signatures.
+
+    Args:
+        system_name (str): Only index writeups from this system.
+        analysis_date (date): Only index writeups from this analysis date.
+
+    Returns:
+        LSHIndex: Keys are (exp_id, system_name, analysis_date) tuples.
+    """
+    query = """
+        SELECT exp_id, system_name, analysis_date, minhash
+        FROM ELN_WRITEUP_API_EXTRACT
+        WHERE minhash IS NOT NULL
+        AND (%(system_name)s IS NULL OR system_name = %(system_name)s)
+        AND (%(analysis_date)s::date IS NULL OR analysis_date = %(analysis_date)s::date)
+    """
+    index = LSHIndex()
+    connection = psycopg2.connect(**DB_CONFIG)
+    cursor = connection.cursor(name="minhash_load")
+    cursor.itersize = 5000
+    cursor.execute(
+        query, {"system_name": system_name, "analysis_date": analysis_date}
+    )
+    for exp_id, sname, adate, minhash in cursor:
+        index.add((exp_id, sname, adate), signature_from_bytes(minhash))
+    cursor.close()
+    connection.close()
+    return index
+
+
+def find_similar(index, exp_id, threshold=0.8):
+    """
+    Writeups with estimated Jaccard >= threshold to any stored writeup of exp_id.
+    """
+    results = {}
+    for key, signature in list(index.signatures.items()):
+        if key[0] != exp_id:
+            continue
+        for other, jaccard in index.query(signature, threshold, exclude=key):
+            if other[0] != exp_id and jaccard > results.get(other, 0):
+                results[other] = jaccard
+    return sorted(results.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="MinHash/LSH near-duplicate search over stored ELN writeups"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="Compute missing signatures")
+    for name, help_text in [
+        ("query", "Writeups similar to an experiment"),
+        ("clusters", "All near-duplicate clusters"),
+    ]:
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument(
+            "-t", "--threshold", type=float, default=0.8, help="Jaccard threshold"
+        )
+        subparser.add_argument("-s", "--system_name", help="Restrict to one system")
+        subparser.add_argument(
+            "-d", "--analysis_date", help="Restrict to one analysis date (YYYY-MM-DD)"
+        )
+    subparsers.choices["query"].add_argument(
+        "-e", "--exp_id", required=True, help="Experiment ID to search from"
+    )
+    subparsers.choices["clusters"].add_argument(
+        "-o", "--output", help="Write clusters to this CSV file"
+    )
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_signatures()
+    else:
+        index = load_index(args.system_name, args.analysis_date)
+        print(f"{len(index.signatures)} signatures indexed")
+        if args.command == "query":
+            for (exp_id, system_name, analysis_date), jaccard in find_similar(
+                index, args.exp_id, args.threshold
+            ):
+                print(f"{exp_id:<8} {system_name:<24} {analysis_date} {jaccard:.3f}")
+        else:
+            clusters = index.clusters(args.threshold)
+            print(f"{len(clusters)} clusters found")
+            if args.output:
+                with open(args.output, "w", newline="") as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(["cluster", "exp_id", "system_name", "analysis_date"])
+                    for i, cluster in enumerate(clusters, start=1):
+                        for key in cluster:
+                            writer.writerow([i, *key])
+            else:
+                for i, cluster in enumerate(clusters, start=1):
+                    print(f"{i}: {', '.join(key[0] for key in cluster)}")
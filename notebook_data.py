@@ -0,0 +1,242 @@
+"""
+Lazy, memory-lean access to the writeup and comparison tables for notebooks.
+
+One SQLAlchemy engine is created per kernel and reused. Only the metric columns
+are read by default, streamed through a server-side cursor in chunks, and each
+chunk is shrunk as it arrives: system names and tiers become categoricals and
+scores become float32. The writeup and diff bodies, which make up nearly all of
+the table size, are fetched on demand for the rows a notebook selects.
+
+Usage:
+    from notebook_data import read_comparisons, fetch_diffs
+    df = read_comparisons(since="2025-03-01", is_match=False)
+    fetch_diffs(df.head(20))
+"""
+
+import pandas as pd
+from os import getenv
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from pandas.api.types import union_categoricals
+
+
+load_dotenv(override=True)
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+ENGINE = None
+CHUNK_SIZE = 50000
+WRITEUP_KEY = ["exp_id", "system_name", "analysis_date"]
+WRITEUP_COLUMNS = WRITEUP_KEY + ["LENGTH(write_up) AS write_up_length"]
+COMPARISON_KEY = ["exp_id", "system_name_1", "system_name_2", "analysis_date"]
+COMPARISON_COLUMNS = COMPARISON_KEY + [
+    "match_percentage",
+    "is_match",
+    "scibert_score",
+    "tfidf_score",
+    "compare_tier",
+]
+CATEGORY_COLUMNS = {"system_name", "system_name_1", "system_name_2", "compare_tier"}
+FLOAT_COLUMNS = {"match_percentage", "scibert_score", "tfidf_score"}
+
+
+def get_engine():
+    """
+    Engine shared by every read of the kernel.
+    """
+    global ENGINE
+    if ENGINE is None:
+        ENGINE = create_engine(
+            "postgresql+psycopg2://",
+            connect_args=DB_CONFIG,
+            pool_pre_ping=True,
+        )
+    return ENGINE
+
+
+def shrink(df):
+    """
+    Categorical system names and tiers, float32 scores, int32 lengths and
+    datetime analysis dates, in place.
+    """
+    for column in df.columns:
+        if column in CATEGORY_COLUMNS:
+            df[column] = df[column].astype("category")
+        elif column in FLOAT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], downcast="float")
+        elif column == "write_up_length":
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+        elif column == "is_match":
+            df[column] = df[column].astype("boolean")
+        elif column == "analysis_date":
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def concat_chunks(chunks):
+    """
+    Concatenate shrunk chunks, keeping the categorical columns categorical
+    although each chunk has its own categories.
+    """
+    chunks = list(chunks)
+    df = pd.concat(chunks, ignore_index=True)
+    for column in CATEGORY_COLUMNS.intersection(df.columns):
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = pd.Categorical(union_categoricals([chunk[column] for chunk in chunks]))
+    return df
+
+
+def read_chunks(query, params, chunksize):
+    """
+    Shrunk DataFrame chunks of a query read through a server-side cursor.
+    """
+    with get_engine().connect().execution_options(stream_results=True) as connection:
+        for chunk in pd.read_sql(query, connection, params=params, chunksize=chunksize):
+            yield shrink(chunk)
+
+
+def read_table(table, columns, order, conditions, params, chunksize=None):
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {', '.join(order)}"
+    chunks = read_chunks(query, params, chunksize or CHUNK_SIZE)
+    return chunks if chunksize else concat_chunks(chunks)
+
+
+def read_writeups(columns=None, since=None, until=None, system_names=None, chunksize=None):
+    """
+    Read ELN_WRITEUP_API_EXTRACT, without the writeup bodies by default.
+
+    Args:
+        columns (list): Columns or SQL expressions, defaults to the key and the writeup length.
+        since (date): First analysis date.
+        until (date): Last analysis date.
+        system_names (list): Only these systems.
+        chunksize (int): Yield DataFrames of this many rows instead of one DataFrame.
+
+    Returns:
+        DataFrame, or an iterator of DataFrames when chunksize is set.
+    """
+    conditions = []
+    if since is not None:
+        conditions.append("analysis_date >= %(since)s")
+    if until is not None:
+        conditions.append("analysis_date <= %(until)s")
+    if system_names:
+        conditions.append("system_name = ANY(%(system_names)s)")
+    params = {"since": since, "until": until, "system_names": list(system_names or [])}
+    return read_table(
+        "ELN_WRITEUP_API_EXTRACT", columns or WRITEUP_COLUMNS, WRITEUP_KEY, conditions, params, chunksize
+    )
+
+
+def read_comparisons(
+    columns=None,
+    since=None,
+    until=None,
+    system_name_1=None,
+    system_name_2=None,
+    is_match=None,
+    chunksize=None,
+):
+    """
+    Read ELN_WRITEUP_COMPARISON, without the diffs by default.
+
+    Args:
+        columns (list): Columns or SQL expressions, defaults to the key and metrics.
+        since (date): First analysis date.
+        until (date): Last analysis date.
+        system_name_1 (str): First system name.
+        system_name_2 (str): Second system name.
+        is_match (bool): Only matches or only mismatches.
+        chunksize (int): Yield DataFrames of this many rows instead of one DataFrame.
+
+    Returns:
+        DataFrame, or an iterator of DataFrames when chunksize is set.
+    """
+    params = {
+        "since": since,
+        "until": until,
+        "system_name_1": system_name_1,
+        "system_name_2": system_name_2,
+        "is_match": is_match,
+    }
+    conditions = [
+        condition
+        for condition, name in (
+            ("analysis_date >= %(since)s", "since"),
+            ("analysis_date <= %(until)s", "until"),
+            ("system_name_1 = %(system_name_1)s", "system_name_1"),
+            ("system_name_2 = %(system_name_2)s", "system_name_2"),
+            ("is_match = %(is_match)s", "is_match"),
+        )
+        if params[name] is not None
+    ]
+    return read_table(
+        "ELN_WRITEUP_COMPARISON", columns or COMPARISON_COLUMNS, COMPARISON_KEY, conditions, params, chunksize
+    )
+
+
+def fetch_bodies(table, key, rows, columns):
+    """
+    Columns of the rows of a table matching the key columns of the selected rows.
+    """
+    keys = rows[key].drop_duplicates()
+    if keys.empty:
+        return pd.DataFrame(columns=key + columns)
+    arrays = ", ".join(
+        f"%({column})s::date[]" if column == "analysis_date" else f"%({column})s::text[]"
+        for column in key
+    )
+    query = f"""
+        SELECT {', '.join(f't.{column}' for column in key + columns)}
+        FROM {table} t
+        JOIN unnest({arrays}) AS k({', '.join(key)})
+            USING ({', '.join(key)})
+        ORDER BY {', '.join(f't.{column}' for column in key)}
+    """
+    params = {
+        column: (
+            [value.date() for value in pd.to_datetime(keys[column])]
+            if column == "analysis_date"
+            else keys[column].astype(str).tolist()
+        )
+        for column in key
+    }
+    return shrink(pd.read_sql(query, get_engine(), params=params))
+
+
+def fetch_writeups(rows, columns=("write_up",)):
+    """
+    Writeup bodies of selected read_writeups rows.
+
+    Args:
+        rows (DataFrame): Rows with exp_id, system_name and analysis_date.
+        columns (tuple): Body columns, e.g. write_up, normalized_text, summary_data.
+
+    Returns:
+        DataFrame: Key columns and the body columns.
+    """
+    return fetch_bodies("ELN_WRITEUP_API_EXTRACT", WRITEUP_KEY, rows, list(columns))
+
+
+def fetch_diffs(rows):
+    """
+    Diffs of selected read_comparisons rows.
+
+    Args:
+        rows (DataFrame): Rows with exp_id, system_name_1, system_name_2 and analysis_date.
+
+    Returns:
+        DataFrame: Key columns and the diff.
+    """
+    return fetch_bodies("ELN_WRITEUP_COMPARISON", COMPARISON_KEY, rows, ["diff"])
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,291 @@
+"""
+Render cache of the highlighted review HTML of ELN_WRITEUP_SCRAPPED rows.
+
+The review notebook shows each scraped writeup with its reactants, solvents
+and products highlighted, next to the three chemical tables. Rendering means
+stripping the inline styles with BeautifulSoup and regex-highlighting every
+compound, so it is done once per (exp_id, system_name, content hash) and the
+fragments are kept in ELN_WRITEUP_RENDER_CACHE. The hash covers the writeup,
+the tables, the highlight colour and RENDER_VERSION, so only rows whose
+content (or the renderer) changed are rendered again.
+
+Usage:
+    python render_cache.py -d 2025-03-01
+"""
+
+import re
+import json
+import hashlib
+import argparse
+import psycopg2
+import psycopg2.extras
+from html import escape
+from os import getenv
+from datetime import datetime
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from writeup_parser import parse_table
+
+
+load_dotenv(override=True)
+DB_CONFIG = {
+    "dbname": getenv("DB_NAME"),
+    "user": getenv("DB_USER"),
+    "password": getenv("DB_PASS"),
+    "host": getenv("DB_HOST"),
+    "port": getenv("DB_PORT"),
+}
+# bump when the rendered HTML changes, so every cached fragment is rendered again
+RENDER_VERSION = 2
+CHEM_COLOUR = "#004466"
+TABLES = ("reactants", "solvents", "products")
+FRAGMENTS = ("write_up_html", "reactants_html", "solvents_html", "products_html")
+CACHE_DDL = """
+CREATE TABLE IF NOT EXISTS ELN_WRITEUP_RENDER_CACHE (
+    exp_id VARCHAR(7) NOT NULL,
+    system_name VARCHAR(20) NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    write_up_html TEXT NOT NULL,
+    reactants_html TEXT NOT NULL,
+    solvents_html TEXT NOT NULL,
+    products_html TEXT NOT NULL,
+    rendered_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (exp_id, system_name)
+);
+"""
+
+
+def remove_styles(html_output):
+    soup = BeautifulSoup(html_output, "html.parser")
+    for tag in soup.find_all(style=True):
+        del tag["style"]
+    return soup.prettify()
+
+
+def table_compounds(row, name):
+    """Compound names of a chemical table, parsed from its html when the JSONB is not backfilled."""
+    table = row[name]
+    if not isinstance(table, dict):
+        table = parse_table(row[f"{name}_table"]) if row[f"{name}_table"] else None
+    return table["compounds"] if table else []
+
+
+def render_table(table, html_table):
+    """Render a parsed (JSONB) chemical table; rows not yet backfilled fall back to the raw html."""
+    if not isinstance(table, dict):
+        return remove_styles(html_table) if html_table else ""
+    header = "".join(f"<th>{escape(column)}</th>" for column in table["columns"])
+    rows = "".join(
+        "<tr>" + "".join(f"<td>{escape(cell)}</td>" for cell in row) + "</tr>"
+        for row in table["rows"]
+    )
+    return f"<table><thead><tr>{header}</tr></thead><tbody>{rows}</tbody></table>"
+
+
+def color_code_writeup(row, colour=CHEM_COLOUR):
+    """Color-code reactants, solvents, and products in the write-up column."""
+    write_up = remove_styles(row["write_up"])
+    chem_agents = [compound for name in TABLES for compound in table_compounds(row, name)]
+    if chem_agents:
+        pattern = r"(" + "|".join(re.escape(value) for value in chem_agents if value) + r")"
+        write_up = re.sub(
+            pattern, rf'<span style="color: {colour};">\1</span>', write_up, flags=re.IGNORECASE
+        )
+    return write_up
+
+
+def content_hash(row, colour=CHEM_COLOUR):
+    """
+    SHA-256 of everything a row's fragments are rendered from.
+    """
+    content = [RENDER_VERSION, colour, row["write_up"]]
+    for name in TABLES:
+        table = row[name]
+        # the raw html is only rendered when the table has not been parsed
+        content.append(table if isinstance(table, dict) else row[f"{name}_table"])
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def render_row(row, colour=CHEM_COLOUR):
+    """
+    Rendered fragments of a row, by FRAGMENTS name.
+    """
+    fragments = {"write_up_html": color_code_writeup(row, colour)}
+    for name in TABLES:
+        fragments[f"{name}_html"] = render_table(row[name], row[f"{name}_table"])
+    return fragments
+
+
+def create_cache(cursor):
+    cursor.execute(CACHE_DDL)
+
+
+def cached_fragments(cursor, hashes):
+    """
+    Cached fragments of the rows whose cached content hash is still current.
+
+    Args:
+        cursor (cursor): Database cursor.
+        hashes (dict): Content hash by (exp_id, system_name).
+
+    Returns:
+        dict: Fragments by (exp_id, system_name).
+    """
+    if not hashes:
+        return {}
+    exp_ids, system_names = zip(*hashes)
+    cursor.execute(
+        f"""
+        SELECT c.exp_id, c.system_name, c.content_hash, {', '.join(f'c.{name}' for name in FRAGMENTS)}
+        FROM ELN_WRITEUP_RENDER_CACHE c
+        JOIN unnest(%s::text[], %s::text[]) AS k(exp_id, system_name)
+            USING (exp_id, system_name)
+        """,
+        (list(exp_ids), list(system_names)),
+    )
+    return {
+        (exp_id, system_name): dict(zip(FRAGMENTS, fragments))
+        for exp_id, system_name, cached_hash, *fragments in cursor.fetchall()
+        if hashes[(exp_id, system_name)] == cached_hash
+    }
+
+
+def save_fragments(cursor, rendered, hashes):
+    """
+    Upsert rendered fragments with their content hashes in one statement.
+    """
+    psycopg2.extras.execute_values(
+        cursor,
+        f"""
+        INSERT INTO ELN_WRITEUP_RENDER_CACHE
+        (exp_id, system_name, content_hash, {', '.join(FRAGMENTS)})
+        VALUES %s
+        ON CONFLICT (exp_id, system_name) DO UPDATE SET
+        content_hash = EXCLUDED.content_hash,
+        {', '.join(f'{name} = EXCLUDED.{name}' for name in FRAGMENTS)},
+        rendered_at = now()
+        """,
+        [
+            (exp_id, system_name, hashes[(exp_id, system_name)], *(fragments[name] for name in FRAGMENTS))
+            for (exp_id, system_name), fragments in rendered.items()
+        ],
+    )
+
+
+def render_rows(connection, rows, colour=CHEM_COLOUR):
+    """
+    Fragments of the rows, served from the cache and rendered (and cached) only
+    for rows that are new or whose content changed.
+
+    Args:
+        connection (connection): Database connection; committed when rows were rendered.
+        rows (list): Row mappings with exp_id, system_name, write_up and the
+            reactants/solvents/products JSONB and *_table html.
+        colour (str): Highlight colour.
+
+    Returns:
+        tuple: (fragments by (exp_id, system_name), rows rendered)
+    """
+    rows = {(row["exp_id"], row["system_name"]): row for row in rows}
+    hashes = {key: content_hash(row, colour) for key, row in rows.items()}
+    cursor = connection.cursor()
+    fragments = cached_fragments(cursor, hashes)
+    rendered = {key: render_row(row, colour) for key, row in rows.items() if key not in fragments}
+    if rendered:
+        save_fragments(cursor, rendered, hashes)
+        connection.commit()
+    cursor.close()
+    fragments.update(rendered)
+    return fragments, len(rendered)
+
+
+def with_rendered_html(df, colour=CHEM_COLOUR):
+    """
+    Copy of a DataFrame of scraped rows with write_up replaced by the
+    highlighted writeup and reactants_html/solvents_html/products_html added,
+    all read from or stored in the render cache.
+    """
+    connection = psycopg2.connect(**DB_CONFIG)
+    try:
+        cursor = connection.cursor()
+        create_cache(cursor)
+        connection.commit()
+        cursor.close()
+        fragments, rendered = render_rows(connection, df.to_dict("records"), colour)
+    finally:
+        connection.close()
+    df = df.copy()
+    keys = list(zip(df["exp_id"], df["system_name"]))
+    df["write_up"] = [fragments[key]["write_up_html"] for key in keys]
+    for name in TABLES:
+        df[f"{name}_html"] = [fragments[key][f"{name}_html"] for key in keys]
+    print(f"{len(keys) - rendered} writeups from the render cache, {rendered} rendered")
+    return df
+
+
+def prerender(since=None, batch_size=200, colour=CHEM_COLOUR):
+    """
+    Render every scraped row that has no current cache entry, so the review
+    notebook only reads cached fragments.
+
+    Args:
+        since (date): Only rows created from this date on.
+        batch_size (int): Rows read, rendered and committed together.
+        colour (str): Highlight colour.
+    """
+    connection = psycopg2.connect(**DB_CONFIG)
+    cursor = connection.cursor()
+    create_cache(cursor)
+    connection.commit()
+    cursor.close()
+
+    read_cursor = connection.cursor(
+        name="prerender_writeups", cursor_factory=psycopg2.extras.RealDictCursor, withhold=True
+    )
+    read_cursor.itersize = batch_size
+    query = """
+        SELECT exp_id, system_name, write_up, reactants_table, solvents_table, products_table,
+               reactants, solvents, products
+        FROM ELN_WRITEUP_SCRAPPED
+    """
+    if since is not None:
+        query += " WHERE created_date >= %(since)s"
+    read_cursor.execute(query, {"since": since})
+    connection.commit()
+    total = rendered = 0
+    while True:
+        batch = read_cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        _, count = render_rows(connection, batch, colour)
+        total += len(batch)
+        rendered += count
+        print(f"{total} rows checked, {rendered} rendered...")
+    read_cursor.close()
+    connection.close()
+    print(f"{rendered} of {total} rows rendered, {total - rendered} already cached")
+
+
+def valid_date(date_str):
+    """
+    Validate that the date string is in the format YYYY-MM-DD.
+    """
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid date format: {date_str}. Expected format: YYYY-MM-DD"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Prerender the highlighted review HTML of scraped ELN writeups"
+    )
+    parser.add_argument("-d", "--since", type=valid_date, help="First created date, YYYY-MM-DD")
+    parser.add_argument("-b", "--batch_size", type=int, default=200, help="Rows per batch")
+    parser.add_argument("--colour", default=CHEM_COLOUR, help="Highlight colour")
+    args = parser.parse_args()
+    prerender(args.since, args.batch_size, args.colour)
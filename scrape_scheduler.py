@@ -0,0 +1,98 @@
+"""
+Pipelined scheduler for scraping experiments across domains.
+
+A bounded pool of scrape workers pulls (exp_id, domain) tasks from the executor
+queue. As soon as every domain of an experiment has landed, its comparison is
+queued on a separate single-thread executor, so scraping of later experiments
+continues while earlier ones are compared. Progress and ETA are logged as
+pages land.
+"""
+
+import time
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+PROGRESS_EVERY = 10
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def log_progress(done, total, start, comparisons_done, comparisons_queued):
+    elapsed = time.monotonic() - start
+    rate = done / elapsed if elapsed else 0
+    eta = (total - done) / rate if rate else 0
+    logging.info(
+        f"Scraped {done}/{total} pages ({done / total:.1%}), {rate:.2f} pages/s, "
+        f"ETA {format_duration(eta)}; comparisons {comparisons_done} done, "
+        f"{comparisons_queued - comparisons_done} queued"
+    )
+
+
+def run_pipeline(exp_ids, domains, scrape, compare, workers, progress_every=PROGRESS_EVERY):
+    """
+    Scrape every (exp_id, domain) pair and compare each experiment once all of
+    its domains have been scraped.
+
+    Args:
+        exp_ids (list): Experiment IDs, scraped in order; duplicates are dropped.
+        domains (list): Domains scraped for every experiment.
+        scrape (callable): scrape(exp_id, domain, index) for one page.
+        compare (callable): compare(exp_id) once all domains have landed.
+        workers (int): Number of concurrent scrape workers.
+        progress_every (int): Log progress every this many pages.
+    """
+    # the exp_id files are appended to and may repeat ids; each is scraped and compared once
+    unique_exp_ids = list(dict.fromkeys(exp_ids))
+    if len(unique_exp_ids) < len(exp_ids):
+        logging.info(f"Skipping {len(exp_ids) - len(unique_exp_ids)} duplicate experiment IDs")
+    exp_ids = unique_exp_ids
+    total = len(exp_ids) * len(domains)
+    landed = Counter()
+    comparisons = []
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as scrape_executor, ThreadPoolExecutor(
+        max_workers=1
+    ) as compare_executor:
+        futures = {
+            scrape_executor.submit(scrape, exp_id, domain, i): (exp_id, domain)
+            for i, exp_id in enumerate(exp_ids, start=1)
+            for domain in domains
+        }
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            exp_id, domain = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error during scraping {exp_id} on {domain}: {e}")
+
+            landed[exp_id] += 1
+            if landed[exp_id] == len(domains):
+                comparisons.append(compare_executor.submit(compare, exp_id))
+
+            if done % progress_every == 0 or done == total:
+                log_progress(
+                    done,
+                    total,
+                    start,
+                    sum(comparison.done() for comparison in comparisons),
+                    len(comparisons),
+                )
+
+        for comparison in comparisons:
+            try:
+                comparison.result()
+            except Exception as e:
+                logging.error(f"Error during comparison: {e}")
+
+    logging.info(
+        f"Pipeline finished: {total} pages and {len(comparisons)} comparisons in "
+        f"{format_duration(time.monotonic() - start)}"
+    )
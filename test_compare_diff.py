@@ -1,4 +1,3 @@
-import re
 from os import getenv
 from difflib import unified_diff, SequenceMatcher
 import torch
@@ -8,6 +7,7 @@ from sklearn.metrics.pairwise import cosine_similarity
 import psycopg2
 import random
 from dotenv import load_dotenv
+from compare_modules import normalize_writeup, normalize_text
 
 MODEL_NAME = "allenai/scibert_scivocab_uncased"
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
@@ -65,17 +65,8 @@ def tfidf_compare(text1, text2):
 
 
 def clean_text(text):
-    text = (
-        text.replace("\r", "")  # Remove Windows-style line endings
-        .replace("\u200b", "")  # Remove zero-width space
-        .replace("\u00A0", " ")  # Replace non-breaking spaces with normal spaces
-        .replace("\u00AD", "")  # Remove soft hyphen
-        .encode("utf-8", "ignore").decode("utf-8")  # Remove any non-UTF characters
-        .strip()  # Trim leading and trailing spaces/newlines
-    )
-    
-    # Normalize multiple spaces to a single space
-    return re.sub(r"\s+", " ", text)
+    # single line output, as this script always printed it
+    return normalize_text(normalize_writeup(text))
 
 
 def extract_writeups_from_diff(diff_text):
@@ -0,0 +1,30 @@
+import pytest
+from compare_modules import similarity, ENGINES
+
+
+MULTI_LINE_PAIRS = [
+    ("x\ny", "x y"),
+    ("a b c\nd e f\ng h i", "a b c d e f g h i"),
+    ("line one\nline two\n\nline three", "line one\nline 2\n\nline three\n"),
+    ("same\nlines", "same\nlines"),
+    ("", "x\ny"),
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("writeup1, writeup2", MULTI_LINE_PAIRS)
+def test_match_percentage_bounded_for_multi_line_writeups(engine, writeup1, writeup2):
+    _, match_percentage = similarity(writeup1, writeup2, engine)
+    assert 0.0 <= match_percentage <= 100.0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_identical_multi_line_writeups_match_fully(engine):
+    _, match_percentage = similarity("a\nb\nc", "a\nb\nc", engine)
+    assert match_percentage == 100.0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_rewrapped_lines_do_not_exceed_100(engine):
+    _, match_percentage = similarity("x\ny", "x y", engine)
+    assert match_percentage <= 100.0
@@ -0,0 +1,31 @@
+import csv
+import io
+import pytest
+import export_comparisons
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_export_parquet_diffs_across_block_boundaries(tmp_path, monkeypatch):
+    columns = ["exp_id", "match_percentage", "diff"]
+    rows = [
+        (f"E{i:05d}", i % 100 + 0.5, "--- \n+++ \n@@ -1,2 +1,2 @@\n-old, \"line\"\n+new line\n" * (i % 7 + 1))
+        for i in range(2000)
+    ]
+
+    def copy_csv(cursor, query, file):
+        text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        text.flush()
+        text.detach()
+
+    monkeypatch.setattr(export_comparisons, "copy_csv", copy_csv)
+    monkeypatch.setattr(export_comparisons, "BLOCK_SIZE", 4096)
+    output = tmp_path / "comparisons.parquet"
+    export_comparisons.export_parquet(None, "", str(output), columns)
+
+    table = pq.read_table(output)
+    assert table.column("exp_id").to_pylist() == [row[0] for row in rows]
+    assert table.column("diff").to_pylist() == [row[2] for row in rows]
@@ -0,0 +1,218 @@
+"""
+Offline parser for the Dotmatics samplenotebook iframe.
+
+The scraper grabs the iframe document once (driver.page_source) and this module
+extracts the created date, the Reactants/Solvents/Products tables and the
+writeup from it, so the extraction needs no browser round trips and can be run
+against saved pages. The chemical tables are also parsed into structured data
+(columns, rows, compound names and amounts) stored as JSONB.
+"""
+
+import re
+import logging
+from datetime import datetime
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"]
+TABLE_LABELS = ["Reactants", "Solvents", "Products"]
+NAME_COLUMN = re.compile(r"name|compound|reagent|reactant|solvent|product|chemical|material", re.IGNORECASE)
+AMOUNT = re.compile(
+    r"^(\d+(?:[.,]\d+)?)\s*(mg|g|kg|µg|ug|ml|mL|l|L|µl|µL|ul|uL|mmol|µmol|umol|mol|eq|equiv|%)$"
+)
+NUMBER = re.compile(r"^[\d.,%\s\-+/()]+$")
+
+
+def parse_date(date_text):
+    """
+    Parse the created date with the known ELN date formats.
+
+    Returns:
+        datetime: Parsed date, or None if no format matches.
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_text, date_format)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def extract_date_text(soup):
+    """
+    Text of the first span (or else div) in the body of the Date table.
+    """
+    date_div = soup.find("div", attrs={"data-customlabel": "Date"})
+    date_table = date_div.find("table", recursive=False) if date_div else None
+    if date_table is None:
+        return None
+    body = date_table.find("tbody") or date_table
+    for tag_name in ("span", "div"):
+        tag = body.find(tag_name)
+        if tag is not None and tag.get_text().strip():
+            return tag.get_text().strip()
+    return None
+
+
+def _label_span(soup, label):
+    return soup.find(
+        lambda tag: tag.name == "span"
+        and any(f" {label} " in text for text in tag.find_all(string=True, recursive=False))
+    )
+
+
+def find_table(soup, label):
+    """
+    Table following the span labelled with the chemical table label, or None.
+    """
+    span = _label_span(soup, label)
+    if span is None:
+        return None
+    table_div = span.find_next_sibling("div", attrs={"data-customlabel": "Table"})
+    return table_div.find("table") if table_div else None
+
+
+def extract_table(soup, label):
+    """
+    outerHTML of the table following the span labelled with the chemical table label.
+    """
+    table = find_table(soup, label)
+    return str(table) if table is not None else None
+
+
+def parse_amount(text):
+    """
+    Parse an amount such as '1.20 g' or '2 eq'.
+
+    Returns:
+        tuple: (value, unit), or None if the text is not an amount.
+    """
+    match = AMOUNT.match(text.strip())
+    if not match:
+        return None
+    return float(match.group(1).replace(",", ".")), match.group(2)
+
+
+def parse_table(table):
+    """
+    Structured content of a chemical table.
+
+    The compound of a row is its cell in the first name-like column (by header),
+    or else its first cell that is not a number or an amount; compounds are at
+    least two characters long, as they are highlighted case-insensitively.
+
+    Args:
+        table (str or Tag): Table outerHTML or parsed table.
+
+    Returns:
+        dict: columns (header texts), rows (cell texts), compounds (compound
+        names) and amounts (compound, value, unit and column per amount cell),
+        or None if there is no table.
+    """
+    if table is None:
+        return None
+    if isinstance(table, str):
+        table = BeautifulSoup(table, PARSER).find("table")
+        if table is None:
+            return None
+
+    columns = [cell.get_text(" ", strip=True) for cell in table.select("thead th")]
+    rows = []
+    for tr in table.find_all("tr"):
+        if tr.find_parent("thead") is not None:
+            continue
+        cells = [cell.get_text(" ", strip=True) for cell in tr.find_all(["td", "th"])]
+        if not columns and tr.find("td") is None:
+            columns = cells
+        elif any(cells):
+            rows.append(cells)
+
+    name_column = next(
+        (i for i, column in enumerate(columns) if NAME_COLUMN.search(column)), None
+    )
+    compounds, amounts = [], []
+    for cells in rows:
+        if name_column is not None and name_column < len(cells):
+            compound = cells[name_column] if len(cells[name_column]) >= 2 else None
+        else:
+            compound = next(
+                (
+                    cell
+                    for cell in cells
+                    if len(cell) >= 2 and not NUMBER.match(cell) and parse_amount(cell) is None
+                ),
+                None,
+            )
+        if compound:
+            compounds.append(compound)
+        for i, cell in enumerate(cells):
+            amount = parse_amount(cell)
+            if amount:
+                amounts.append(
+                    {
+                        "compound": compound,
+                        "value": amount[0],
+                        "unit": amount[1],
+                        "column": columns[i] if i < len(columns) else None,
+                    }
+                )
+    return {"columns": columns, "rows": rows, "compounds": compounds, "amounts": amounts}
+
+
+def extract_writeup(soup):
+    """
+    Writeup from the Textarea block: the formInputArea2 span, or else the
+    data-type='writeup' element, joined as the outerHTML of all its descendants.
+    """
+    textarea_div = soup.find("div", attrs={"data-customlabel": "Textarea"})
+    if textarea_div is None:
+        return None
+    writeup_span = textarea_div.find(
+        "span", class_=lambda classes: classes and "formInputArea2" in classes
+    )
+    if writeup_span is None:
+        writeup_span = textarea_div.find(attrs={"data-type": "writeup"})
+    if writeup_span is None:
+        return None
+    return " ".join(str(tag) for tag in writeup_span.find_all(True))
+
+
+def parse_notebook(html, exp_id=None):
+    """
+    Extract the created date, chemical tables and writeup from the iframe html.
+
+    Args:
+        html (str): samplenotebook iframe document.
+        exp_id (str): Experiment ID, for log messages.
+
+    Returns:
+        dict: created_date (datetime or None), date_text, tables (label to
+        table outerHTML or None), chemicals (label to parse_table data or None)
+        and write_up (str or None).
+    """
+    soup = BeautifulSoup(html, PARSER)
+    date_text = extract_date_text(soup)
+    tables, chemicals = {}, {}
+    for label in TABLE_LABELS:
+        table = find_table(soup, label)
+        tables[label] = str(table) if table is not None else None
+        chemicals[label] = parse_table(table)
+        if table is None:
+            logging.error(f"Error extracting table element for {exp_id} - {label}")
+    write_up = extract_writeup(soup)
+    if write_up is None:
+        logging.error(f"Error extracting writeup element {exp_id}")
+    return {
+        "created_date": parse_date(date_text),
+        "date_text": date_text,
+        "tables": tables,
+        "chemicals": chemicals,
+        "write_up": write_up,
+    }